@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from cleaning import TIMESTAMP_FORMAT, clean_timestamps
+
+# Pour lancer le benchmark :
+# python benchmark.py --rows 10000 100000 1000000 --output bench.json
+# python benchmark.py --rows 1000000 --compare bench.json
+# Les fichiers synthétiques sont générés une seule fois (bench/bench_<lignes>.txt) puis réutilisés.
+# Chaque étape (lecture, nettoyage, ingestion, moyenne, coupures, graphiques, export) est chronométrée,
+# puis relancée sous tracemalloc pour mesurer son pic de mémoire ; les résultats sont écrits en JSON,
+# avec le temps de démarrage à froid (import dans un nouveau processus) de chaque script.
+
+# Scripts dont le temps d'import est mesuré, et nombre de mesures (le minimum est gardé)
+STARTUP_MODULES = ('justplot', 'main')
+STARTUP_RUNS = 5
+
+BENCH_DIR = 'bench'
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+# Proportions de lignes incorrectes, de champs vides et d'interruptions de l'enregistrement dans le fichier généré
+BAD_LINE_FRACTION = 0.001
+EMPTY_FIELD_FRACTION = 0.0005
+GAP_FRACTION = 0.0001
+
+# Lignes par paquet généré ; un marqueur "XX_XX_XX.CSV" et un commentaire sont écrits avant chaque paquet
+GENERATE_CHUNK = 100_000
+
+# (colonne, valeur de départ, écart-type du pas de la marche aléatoire, décimales) des champs du logger
+FIELDS = [
+    ('PM1.0(ug/m3)', 8.0, 0.3, 0), ('PM2.5(ug/m3)', 12.0, 0.4, 0), ('PM10(ug/m3)', 18.0, 0.5, 0),
+    ('N0.3(#/cm3)', 900.0, 10.0, 2), ('N0.5(#/cm3)', 300.0, 5.0, 2), ('N1(#/cm3)', 60.0, 1.0, 2),
+    ('N2.5(#/cm3)', 5.0, 0.2, 2), ('N5(#/cm3)', 1.0, 0.05, 2), ('N10(#/cm3)', 0.3, 0.02, 2),
+    ('T_DPS310(C)', 20.0, 0.02, 2), ('P_DPS310(Pa)', 101325.0, 2.0, 0), ('H_HDC1080(%)', 50.0, 0.05, 2),
+    ('battery level', 90.0, 0.01, 0), ('T_AM2320_EXT(C)', 18.0, 0.02, 1), ('H_AM2320_EXT(%)', 55.0, 0.05, 1),
+    ('Latitude', 45.75, 0.00002, 6), ('Longitude', 4.85, 0.00002, 6), ('Altitude', 170.0, 0.1, 1),
+    ('vitesse(km/h)', 5.0, 0.3, 1), ('nb de satellites', 9.0, 0.05, 0),
+]
+
+
+# Timestamps sans zéros de tête, comme ceux écrits par le logger (ex. 2024_3_7_9_5_2)
+def logger_timestamps(times):
+    times = pd.Series(times)
+    return (times.dt.year.astype(str) + '_' + times.dt.month.astype(str) + '_' +
+            times.dt.day.astype(str) + '_' + times.dt.hour.astype(str) + '_' +
+            times.dt.minute.astype(str) + '_' + times.dt.second.astype(str))
+
+
+# Générer un fichier TXT synthétique au format du logger : champs séparés par ';', mesures en marche aléatoire,
+# enregistrement interrompu de temps en temps, commentaires, marqueurs "XX_XX_XX.CSV", lignes avec un mauvais
+# nombre de champs ou un timestamp invalide, et champs vides
+def generate_logger_file(path, n_rows, seed=0, chunk_size=GENERATE_CHUNK):
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01 00:00:00')
+    seconds = 0
+    levels = np.array([level for _, level, _, _ in FIELDS])
+    steps = np.array([step for _, _, step, _ in FIELDS])
+
+    with open(path, 'w') as f:
+        for offset in range(0, n_rows, chunk_size):
+            n = min(chunk_size, n_rows - offset)
+            f.write(f"# Paquet {offset // chunk_size}\n{(start + pd.Timedelta(seconds, 's')):%H_%M_%S}.CSV\n")
+
+            # Une mesure par seconde, avec des interruptions de 10 minutes à 2 heures
+            delays = np.where(rng.random(n) < GAP_FRACTION, rng.integers(600, 7200, n), 1)
+            elapsed = seconds + np.cumsum(delays)
+            seconds = int(elapsed[-1])
+            timestamps = logger_timestamps(start + pd.to_timedelta(elapsed, unit='s'))
+
+            walk = levels + np.cumsum(rng.normal(0, steps, (n, len(FIELDS))), axis=0)
+            levels = walk[-1]
+            values = pd.DataFrame({i: np.round(np.abs(walk[:, i]), decimals).astype(str)
+                                   for i, (_, _, _, decimals) in enumerate(FIELDS)})
+            values = values.mask(rng.random(values.shape) < EMPTY_FIELD_FRACTION, '')
+
+            lines = timestamps.str.cat(values.astype(str), sep=';')
+            bad = np.flatnonzero(rng.random(n) < BAD_LINE_FRACTION)
+            lines.iloc[bad[::2]] = lines.iloc[bad[::2]].str.rsplit(';', n=3).str[0]
+            lines.iloc[bad[1::2]] = 'ERR_' + lines.iloc[bad[1::2]]
+            f.write('\n'.join(lines) + '\n')
+
+
+# Ancien chemin de nettoyage (iterrows + re.sub + pd.to_datetime ligne par ligne), conservé pour comparaison
+def clean_timestamps_iterrows(df):
+    invalid_timestamps = []
+    cleaned_rows = []
+    for idx, row in df.iterrows():
+        # Avec pandas >= 3 une ligne de chaînes ne peut pas recevoir un Timestamp
+        row = row.astype(object)
+        try:
+            row['horodatage'] = re.sub(r'_(\d{1})(?=\s|,|$)', r'_0\1', row['horodatage'])
+            row['horodatage'] = pd.to_datetime(row['horodatage'], format=TIMESTAMP_FORMAT, errors='raise')
+            cleaned_rows.append(row)
+        except Exception:
+            invalid_timestamps.append((idx, row['horodatage']))
+    return pd.DataFrame(cleaned_rows), invalid_timestamps
+
+
+def load_logger_file(path):
+    df = pd.read_csv(path, sep=';', header=None, dtype=str, comment='#', on_bad_lines='skip')
+    return df.rename(columns={0: 'horodatage'})
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+# Étapes mesurées : fonction(contexte) -> résultat enregistré dans le contexte sous le nom de l'étape
+def stage_parse(ctx):
+    from ingest import iter_lines, iter_valid_rows, new_stats
+    rows = list(iter_valid_rows(iter_lines(ctx['path']), new_stats()))
+    return pd.DataFrame(rows, columns=ctx['columns'][:len(rows[0])])
+
+
+def stage_clean(ctx):
+    from schema import convert_column
+    df, _ = clean_timestamps(ctx['parse'])
+    for col, dtype in ctx['dtypes'].items():
+        if col in df.columns and col != 'horodatage':
+            df[col] = convert_column(df[col], dtype)
+    return df.set_index('horodatage')
+
+
+def stage_ingest(ctx):
+    from ingest import ingest_file
+    df, _ = ingest_file(ctx['path'], ctx['columns'], ctx['dtypes'], csv_path=os.path.join(ctx['tmp'], 'clean.csv'))
+    return df
+
+
+def stage_average(ctx):
+    from pyramid import aggregate, build_pyramid
+    return aggregate(build_pyramid(ctx['ingest']), 60).dropna()
+
+
+def stage_gaps(ctx):
+    from gaps import insert_gaps
+    return insert_gaps(ctx['ingest'])
+
+
+def stage_figures(ctx):
+    from justplot import plot_data
+    return plot_data(ctx['ingest'], 'benchmark', ctx['schema'])
+
+
+def stage_export(ctx):
+    from report import write_report
+    path = os.path.join(ctx['tmp'], 'rapport.html')
+    write_report(path, [('benchmark', ctx['figures'])], 'benchmark')
+    return os.path.getsize(path)
+
+
+# (nom, fonction, étape dont le résultat est nécessaire), dans l'ordre d'exécution
+STAGES = [
+    ('parse', stage_parse, None),
+    ('clean', stage_clean, 'parse'),
+    ('ingest', stage_ingest, None),
+    ('average', stage_average, 'ingest'),
+    ('gaps', stage_gaps, 'ingest'),
+    ('figures', stage_figures, 'ingest'),
+    ('export', stage_export, 'figures'),
+]
+
+
+# Pic de mémoire allouée (numpy et pandas compris) pendant un appel
+def peak_memory(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Mesurer toutes les étapes sur un fichier ; repeat : nombre d'exécutions chronométrées (le minimum est gardé)
+def run_suite(path, stages, repeat=1, memory=True):
+    from schema import SCHEMAS, schema_columns, schema_dtypes
+    schema = SCHEMAS['logger-v1']
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = {'path': path, 'schema': schema, 'columns': schema_columns(schema), 'dtypes': schema_dtypes(schema),
+               'tmp': tmp}
+        # Les étapes non demandées mais nécessaires à une étape demandée sont exécutées sans être mesurées
+        needed = set(stages)
+        for name, _, requires in reversed(STAGES):
+            if name in needed and requires:
+                needed.add(requires)
+        for name, func, _ in STAGES:
+            if name not in stages:
+                if name in needed:
+                    ctx[name] = func(ctx)
+                continue
+            seconds = []
+            for _ in range(repeat):
+                elapsed, ctx[name] = time_call(func, ctx)
+                seconds.append(elapsed)
+            results[name] = {'seconds': min(seconds), 'peak_bytes': peak_memory(func, ctx) if memory else None}
+            peak = f", pic {results[name]['peak_bytes'] / 1024 ** 2:.0f} Mo" if memory else ''
+            print(f"  {name:<8} {results[name]['seconds']:8.3f} s{peak}")
+    return results
+
+
+# Temps d'import de chaque script dans un nouveau processus : démarrage de l'interpréteur compris,
+# sans les modules de graphiques si les imports paresseux sont respectés
+def startup_times(runs=STARTUP_RUNS):
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times = {}
+    for module in ('', *STARTUP_MODULES):
+        seconds = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', f'import {module}' if module else 'pass'], cwd=cwd, check=True)
+            seconds.append(time.perf_counter() - start)
+        times[module or 'python'] = min(seconds)
+        print(f"  démarrage {module or 'python':<8} {times[module or 'python']:8.3f} s")
+    return times
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Afficher le rapport temps actuel / temps de référence de chaque étape commune
+def compare(results, reference):
+    for module, seconds in results.get('startup', {}).items():
+        old = reference.get('startup', {}).get(module)
+        if old:
+            print(f"Démarrage {module:<8} {old:8.3f} s -> {seconds:8.3f} s (x{old / seconds:.2f})")
+    for rows, stages in results['runs'].items():
+        if rows not in reference['runs']:
+            continue
+        print(f"Comparaison avec {reference.get('version')} ({rows} lignes) :")
+        for name, result in stages.items():
+            old = reference['runs'][rows].get(name)
+            if old:
+                print(f"  {name:<8} {old['seconds']:8.3f} s -> {result['seconds']:8.3f} s "
+                      f"(x{old['seconds'] / result['seconds']:.2f})")
+
+
+def compare_iterrows(path):
+    df = load_logger_file(path)
+
+    new_time, (new_df, new_invalid) = time_call(clean_timestamps, df)
+    print(f"Nouveau chemin (vectorisé) : {new_time:.2f} s, {len(new_df)} lignes valides, "
+          f"{len(new_invalid)} timestamps invalides")
+
+    old_time, (old_df, old_invalid) = time_call(clean_timestamps_iterrows, df)
+    print(f"Ancien chemin (iterrows) : {old_time:.2f} s, {len(old_df)} lignes valides, "
+          f"{len(old_invalid)} timestamps invalides")
+
+    print(f"Accélération : x{old_time / new_time:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes de traitement sur des fichiers synthétiques")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Nombres de lignes des fichiers synthétiques (de 10000 à 10000000)")
+    parser.add_argument('--dir', default=BENCH_DIR, help="Répertoire des fichiers synthétiques")
+    parser.add_argument('--stages', nargs='+', choices=[name for name, _, _ in STAGES],
+                        default=[name for name, _, _ in STAGES], help="Étapes à mesurer")
+    parser.add_argument('--repeat', type=int, default=1, help="Exécutions chronométrées par étape (minimum gardé)")
+    parser.add_argument('--no-memory', action='store_true', help="Ne pas mesurer le pic de mémoire (plus rapide)")
+    parser.add_argument('--output', help="Fichier JSON des résultats (défaut : <dir>/bench_<version>.json)")
+    parser.add_argument('--compare', metavar='JSON', help="Résultats de référence à comparer")
+    parser.add_argument('--compare-iterrows', action='store_true',
+                        help="Comparer seulement le nettoyage vectorisé à l'ancien chemin iterrows")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    paths = {}
+    for rows in args.rows:
+        paths[rows] = os.path.join(args.dir, f"bench_{rows}.txt")
+        if not os.path.exists(paths[rows]):
+            print(f"Génération de {paths[rows]} ({rows} lignes)...")
+            generate_logger_file(paths[rows], rows)
+
+    if args.compare_iterrows:
+        for path in paths.values():
+            compare_iterrows(path)
+        return
+
+    version = git_version()
+    results = {
+        'version': version,
+        'date': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'runs': {},
+    }
+    print("Temps de démarrage :")
+    results['startup'] = startup_times()
+    for rows, path in paths.items():
+        print(f"{path} ({rows} lignes) :")
+        results['runs'][str(rows)] = run_suite(path, args.stages, args.repeat, not args.no_memory)
+
+    # Pic de mémoire résidente du processus (Ko sous Linux)
+    if resource is not None:
+        results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    output = args.output or os.path.join(args.dir, f"bench_{version or 'local'}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Résultats enregistrés dans {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
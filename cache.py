@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow est optionnel : sans lui, le cache est simplement désactivé
+    pa = None
+    feather = None
+
+# Répertoire du cache, créé à côté des fichiers traités
+CACHE_DIR = '.plotthedust_cache'
+
+# Taille maximale du répertoire de cache ; les entrées les moins récemment utilisées sont supprimées au-delà
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Octets hachés juste avant la fin des données en cache : permet de vérifier qu'un fichier qui a grandi
+# commence toujours par le contenu mis en cache, sans relire tout le fichier (mode suivi)
+TAIL_HASH_BYTES = 64 * 1024
+
+# Au-delà de ce nombre de segments ajoutés par le mode suivi, l'entrée est réécrite en un seul fichier
+MAX_SEGMENTS = 32
+
+# Version du contenu mis en cache (et des pyramides) : à augmenter quand l'ingestion produit d'autres valeurs
+# pour le même fichier, les entrées existantes sont alors ignorées
+CACHE_VERSION = 3
+
+
+def cache_available():
+    return feather is not None
+
+
+# Empreinte du contenu du fichier source, lue par blocs pour ne pas charger le fichier en mémoire
+def file_hash(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Empreinte du schéma et de la version du cache : un changement de dtype_dict invalide les entrées existantes
+def schema_hash(dtype_dict):
+    key = json.dumps([CACHE_VERSION, dtype_dict], sort_keys=True)
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+# Empreinte des TAIL_HASH_BYTES octets précédant la position size
+def tail_hash(file_path, size):
+    with open(file_path, 'rb') as f:
+        f.seek(max(size - TAIL_HASH_BYTES, 0))
+        return hashlib.blake2b(f.read(min(size, TAIL_HASH_BYTES)), digest_size=16).hexdigest()
+
+
+def meta_path(file_path, cache_dir):
+    key = hashlib.blake2b(os.path.abspath(file_path).encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def data_path(content_hash, dtype_dict, cache_dir):
+    return os.path.join(cache_dir, f"{content_hash}-{schema_hash(dtype_dict)}.feather")
+
+
+# Fichiers Feather d'une entrée : le fichier initial puis les segments ajoutés par le mode suivi
+def segment_paths(meta, dtype_dict, cache_dir):
+    if 'segments' in meta:
+        return [os.path.join(cache_dir, name) for name in meta['segments']]
+    return [data_path(meta['hash'], dtype_dict, cache_dir)]
+
+
+# Description de l'entrée du cache d'un fichier, ou None si elle est absente
+# ou a été écrite pour un autre schéma ou une autre version du cache
+def read_meta(meta_file, dtype_dict):
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    return meta if meta.get('schema') == schema_hash(dtype_dict) else None
+
+
+def remove_entry(meta_file, data_files):
+    for path in [meta_file, *data_files]:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def read_segments(data_files):
+    # Lecture en mémoire partagée (memory map) : les fichiers Feather ne sont pas compressés
+    tables = [feather.read_table(data_file, memory_map=True) for data_file in data_files]
+    df = pa.concat_tables(tables).to_pandas(split_blocks=True).set_index('horodatage')
+
+    # Marquer l'entrée comme récemment utilisée pour la politique d'éviction
+    for data_file in data_files:
+        os.utime(data_file)
+    return df
+
+
+# Horodatages minimal et maximal d'un segment (en nanosecondes) et s'il est trié, enregistrés dans l'entrée :
+# une requête sur une plage de temps ne lit que les segments utiles (voir query.py) ; None si df est vide
+def time_range(df):
+    if not len(df):
+        return None
+    ns = df.index.asi8
+    return {'min': int(ns.min()), 'max': int(ns.max()), 'sorted': bool(df.index.is_monotonic_increasing)}
+
+
+def write_feather(df, dtype_dict, data_file):
+    df = df.astype({col: dtype for col, dtype in dtype_dict.items() if col in df.columns and dtype != 'str'})
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    tmp_file = f"{data_file}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, data_file)
+
+
+# Charger le DataFrame nettoyé depuis le cache s'il correspond toujours au fichier source
+# Retourne (df, stats) ou (None, None) si le cache est absent ou invalide
+def load_cached(file_path, dtype_dict, cache_dir=CACHE_DIR):
+    if not cache_available():
+        return None, None
+
+    meta_file = meta_path(file_path, cache_dir)
+    meta = read_meta(meta_file, dtype_dict)
+    if meta is None:
+        return None, None
+
+    data_files = segment_paths(meta, dtype_dict, cache_dir)
+    if not all(os.path.exists(data_file) for data_file in data_files):
+        remove_entry(meta_file, [])
+        return None, None
+
+    st = os.stat(file_path)
+    if (st.st_size, st.st_mtime_ns) != (meta['size'], meta['mtime_ns']):
+        # Taille ou date modifiée : ne conserver l'entrée que si le contenu est identique
+        # (après un ajout par le mode suivi, l'empreinte du fichier entier n'est plus connue : hash est None,
+        # l'entrée est laissée à load_cached_prefix)
+        if meta['hash'] is None:
+            return None, None
+        if st.st_size != meta['size'] or file_hash(file_path) != meta['hash']:
+            remove_entry(meta_file, data_files)
+            return None, None
+        meta['mtime_ns'] = st.st_mtime_ns
+        with open(meta_file, 'w') as f:
+            json.dump(meta, f)
+
+    return read_segments(data_files), meta['stats']
+
+
+# Mode suivi : charger l'entrée du cache si le fichier source commence toujours par le contenu mis en cache,
+# même s'il a grandi depuis ; les lignes ajoutées se lisent ensuite à partir de stats['offset']
+# Retourne (df, stats) ou (None, None)
+def load_cached_prefix(file_path, dtype_dict, cache_dir=CACHE_DIR):
+    if not cache_available():
+        return None, None
+
+    meta_file = meta_path(file_path, cache_dir)
+    meta = read_meta(meta_file, dtype_dict)
+    if meta is None:
+        return None, None
+
+    data_files = segment_paths(meta, dtype_dict, cache_dir)
+    if ('offset' not in meta['stats'] or meta.get('tail_hash') is None
+            or not all(os.path.exists(data_file) for data_file in data_files)):
+        return None, None
+    if os.path.getsize(file_path) < meta['size'] or tail_hash(file_path, meta['size']) != meta['tail_hash']:
+        return None, None
+
+    # La lecture ne peut reprendre qu'en début de ligne : la dernière ligne en cache doit être complète
+    with open(file_path, 'rb') as f:
+        f.seek(max(meta['size'] - 1, 0))
+        if meta['size'] and f.read(1) != b'\n':
+            return None, None
+
+    return read_segments(data_files), meta['stats']
+
+
+# Enregistrer le DataFrame nettoyé dans le cache, typé selon dtype_dict
+def store_cached(file_path, df, stats, dtype_dict, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    if not cache_available():
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    st = os.stat(file_path)
+    content_hash = file_hash(file_path)
+
+    data_file = data_path(content_hash, dtype_dict, cache_dir)
+    write_feather(df, dtype_dict, data_file)
+
+    # Supprimer les segments de l'entrée précédente du même fichier
+    meta_file = meta_path(file_path, cache_dir)
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            old_files = segment_paths(json.load(f), dtype_dict, cache_dir)
+        remove_entry(None, [path for path in old_files if path != data_file])
+
+    # Si le fichier a grandi pendant l'ingestion, l'entrée ne couvre que les octets lus (stats['offset'])
+    size = stats.get('offset', st.st_size)
+    meta = {
+        'source': os.path.abspath(file_path),
+        'size': size,
+        'mtime_ns': st.st_mtime_ns if size == st.st_size else None,
+        'hash': content_hash if size == st.st_size else None,
+        'tail_hash': tail_hash(file_path, size),
+        'schema': schema_hash(dtype_dict),
+        'segments': [os.path.basename(data_file)],
+        'ranges': [time_range(df)],
+        'stats': stats,
+    }
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+
+    evict(cache_dir, max_bytes)
+
+
+# Mode suivi : ajouter les lignes nouvellement lues (new_df) à l'entrée existante, dans un nouveau segment
+# Seules les nouvelles lignes sont écrites ; les segments sont regroupés au-delà de MAX_SEGMENTS
+def append_cached(file_path, new_df, stats, dtype_dict, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    meta_file = meta_path(file_path, cache_dir)
+    meta = read_meta(meta_file, dtype_dict) if cache_available() else None
+    if meta is None:
+        return
+
+    # Taille du fichier à la fin de la dernière ligne lue : le hachage de fin porte sur le contenu en cache
+    size = stats['offset']
+    data_files = segment_paths(meta, dtype_dict, cache_dir)
+    segment = f"{os.path.splitext(os.path.basename(meta_file))[0]}-{schema_hash(dtype_dict)}-{size}.feather"
+
+    if len(data_files) >= MAX_SEGMENTS:
+        df = pd.concat([read_segments(data_files), new_df])
+        write_feather(df, dtype_dict, os.path.join(cache_dir, segment))
+        remove_entry(None, [path for path in data_files if os.path.basename(path) != segment])
+        meta['segments'] = [segment]
+        meta['ranges'] = [time_range(df)]
+    else:
+        write_feather(new_df, dtype_dict, os.path.join(cache_dir, segment))
+        meta['segments'] = [os.path.basename(path) for path in data_files] + [segment]
+        meta['ranges'] = (meta.get('ranges') or [None] * len(data_files)) + [time_range(new_df)]
+
+    meta.update({
+        'size': size,
+        'mtime_ns': os.stat(file_path).st_mtime_ns if os.path.getsize(file_path) == size else None,
+        'hash': None,
+        'tail_hash': tail_hash(file_path, size),
+        'stats': stats,
+    })
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+
+    evict(cache_dir, max_bytes)
+
+
+# Supprimer les entrées les moins récemment utilisées jusqu'à repasser sous max_bytes
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.feather'):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:  # supprimé entre-temps par un autre processus (mode batch)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
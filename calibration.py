@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+# Pour calculer la table de calibration et corriger les données :
+# python main.py --mode C --calibration D --calibration-table calibration.csv --corrected data_corrige.csv
+# Chaque paire de capteurs est ajustée par capteur = pente * référence + ordonnée à l'origine, sur chaque
+# période (un jour par défaut), sur une fenêtre glissante de plusieurs périodes, ou sur toutes les données.
+# Les ajustements de toutes les périodes sont calculés en une seule passe à partir de sommes groupées.
+
+METHODS = ('ols', 'huber', 'theilsen')
+
+# Constante de Huber (95 % d'efficacité pour des résidus gaussiens) et nombre maximal d'itérations
+HUBER_K = 1.345
+HUBER_ITERATIONS = 20
+
+# Nombre de paires de points tirées au hasard par période pour l'estimateur de Theil-Sen
+THEILSEN_PAIRS = 100_000
+
+DAY_NS = 86_400 * 10 ** 9
+
+TABLE_COLUMNS = ['name', 'reference', 'sensor', 'period', 'start', 'end', 'n', 'slope', 'intercept', 'r2', 'method']
+
+
+# Timestamps des lignes : colonne 'horodatage' si elle existe, sinon l'index
+def time_index(df):
+    return pd.DatetimeIndex(df['horodatage'] if 'horodatage' in df.columns else df.index)
+
+
+# Numéro de période de chaque ligne ; périodes de freq alignées sur minuit, ou une seule période si freq est None
+# Retourne (keys, origin, step) avec origin et step en nanosecondes
+def period_keys(timestamps, freq=None):
+    ns = timestamps.asi8
+    if freq is None:
+        return np.zeros(len(ns), dtype=np.int64), ns.min(), ns.max() - ns.min() + 1
+    step = pd.Timedelta(freq).value
+    origin = ns.min() - ns.min() % DAY_NS
+    return (ns - origin) // step, origin, step
+
+
+def grouped_sums(keys, x, y, n_groups, weights=None):
+    w = np.ones_like(x) if weights is None else weights
+    return [np.bincount(keys, weights=values, minlength=n_groups)
+            for values in (w, w * x, w * y, w * x * x, w * x * y, w * y * y)]
+
+
+def grouped_median(keys, values, n_groups):
+    return pd.Series(values).groupby(keys).median().reindex(range(n_groups)).to_numpy()
+
+
+# Additionner les sommes de `window` périodes consécutives (fenêtre glissante se terminant à chaque période)
+def rolling_sums(sums, window):
+    if window == 1:
+        return sums
+    rolled = []
+    for values in sums:
+        cumulative = np.r_[0.0, np.cumsum(values)]
+        ends = np.arange(1, len(values) + 1)
+        rolled.append(cumulative[ends] - cumulative[np.maximum(ends - window, 0)])
+    return rolled
+
+
+# Pente, ordonnée à l'origine et R² des moindres carrés à partir des sommes (NaN si moins de 2 points)
+def fit_from_sums(n, sx, sy, sxx, sxy, syy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        slope = np.where(n >= 2, cov / var_x, np.nan)
+        intercept = (sy - slope * sx) / n
+        r2 = cov * cov / (var_x * var_y)
+    return slope, intercept, r2
+
+
+# R² d'un ajustement quelconque : 1 - somme des carrés des résidus / somme des carrés totale, par période
+def r_squared(keys, x, y, slope, intercept, n_groups):
+    counts = np.bincount(keys, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_y = np.bincount(keys, weights=y, minlength=n_groups) / counts
+        ss_res = np.bincount(keys, weights=(y - slope[keys] * x - intercept[keys]) ** 2, minlength=n_groups)
+        ss_tot = np.bincount(keys, weights=(y - mean_y[keys]) ** 2, minlength=n_groups)
+        return 1 - ss_res / ss_tot
+
+
+# Régression de Huber par moindres carrés repondérés ; toutes les périodes sont itérées ensemble
+def huber_fit(keys, x, y, n_groups):
+    weights = np.ones_like(x)
+    for _ in range(HUBER_ITERATIONS):
+        slope, intercept, _ = fit_from_sums(*grouped_sums(keys, x, y, n_groups, weights))
+        residuals = np.abs(y - slope[keys] * x - intercept[keys])
+
+        # Échelle robuste des résidus (écart absolu médian) de chaque période
+        scale = HUBER_K * 1.4826 * grouped_median(keys, residuals, n_groups)[keys]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            new_weights = np.where(residuals > scale, scale / residuals, 1.0)
+        new_weights = np.where(np.isfinite(new_weights), new_weights, 1.0)
+
+        converged = np.allclose(new_weights, weights, atol=1e-6)
+        weights = new_weights
+        if converged:
+            break
+    slope, intercept, _ = fit_from_sums(*grouped_sums(keys, x, y, n_groups, weights))
+    return slope, intercept
+
+
+# Estimateur de Theil-Sen : médiane des pentes d'au plus THEILSEN_PAIRS paires de points tirées dans chaque période
+def theilsen_fit(keys, x, y, n_groups, seed=0):
+    order = np.argsort(keys, kind='stable')
+    keys, x, y = keys[order], x[order], y[order]
+    counts = np.bincount(keys, minlength=n_groups)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+
+    pairs = np.minimum(counts * (counts - 1) // 2, THEILSEN_PAIRS)
+    group = np.repeat(np.arange(n_groups), pairs)
+    rng = np.random.default_rng(seed)
+    i = starts[group] + rng.integers(0, counts[group])
+    j = starts[group] + rng.integers(0, counts[group])
+
+    dx = x[j] - x[i]
+    valid = dx != 0
+    slope = grouped_median(group[valid], (y[j] - y[i])[valid] / dx[valid], n_groups)
+    intercept = grouped_median(keys, y - slope[keys] * x, n_groups)
+    return slope, intercept
+
+
+# Table de calibration : une ligne par paire de capteurs et par période
+# pairs : liste de {'name', 'reference', 'sensor'} ; freq : taille des périodes (None pour un seul ajustement global)
+# window : nombre de périodes consécutives par ajustement (fenêtre glissante) ; method : 'ols', 'huber' ou 'theilsen'
+def calibration_table(df, pairs, freq='1D', window=1, method='ols'):
+    if method not in METHODS:
+        raise ValueError(f"Méthode de calibration inconnue : {method}")
+    if method != 'ols' and window != 1:
+        raise ValueError("Les méthodes robustes ne sont disponibles que sans fenêtre glissante (window=1)")
+
+    timestamps = time_index(df)
+    if not len(timestamps) or not pairs:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    all_keys, origin, step = period_keys(timestamps, freq)
+    n_groups = int(all_keys.max()) + 1
+
+    tables = []
+    for pair in pairs:
+        x = df[pair['reference']].to_numpy(dtype='float64')
+        y = df[pair['sensor']].to_numpy(dtype='float64')
+        valid = np.isfinite(x) & np.isfinite(y)
+        keys, x, y = all_keys[valid], x[valid], y[valid]
+
+        # Centrer les données pour limiter les erreurs d'arrondi dans les sommes
+        mean_x, mean_y = (x.mean(), y.mean()) if len(x) else (0.0, 0.0)
+        xc, yc = x - mean_x, y - mean_y
+
+        sums = rolling_sums(grouped_sums(keys, xc, yc, n_groups), window)
+        n = sums[0]
+        if method == 'ols':
+            slope, intercept, r2 = fit_from_sums(*sums)
+        else:
+            fit = huber_fit if method == 'huber' else theilsen_fit
+            slope, intercept = fit(keys, xc, yc, n_groups)
+            r2 = r_squared(keys, xc, yc, slope, intercept, n_groups)
+        intercept = intercept + mean_y - slope * mean_x
+
+        periods = np.arange(n_groups)
+        tables.append(pd.DataFrame({
+            'name': pair['name'],
+            'reference': pair['reference'],
+            'sensor': pair['sensor'],
+            'period': pd.to_datetime(origin + periods * step),
+            'start': pd.to_datetime(origin + (periods - window + 1).clip(0) * step),
+            'end': pd.to_datetime(origin + (periods + 1) * step),
+            'n': n.astype(np.int64),
+            'slope': slope,
+            'intercept': intercept,
+            'r2': r2,
+            'method': method,
+        })[n > 0])
+    return pd.concat(tables, ignore_index=True)
+
+
+# Enregistrer la table en Parquet (extension .parquet, nécessite pyarrow) ou en CSV (séparateur ';')
+def save_table(table, path):
+    if path.endswith('.parquet'):
+        table.to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False, sep=';')
+    print(f"Table de calibration enregistrée dans {path}")
+
+
+# Ajouter pour chaque capteur de la table une colonne '<capteur>_calibrated' ramenée sur sa référence :
+# (capteur - ordonnée à l'origine) / pente, avec l'ajustement de la période de chaque ligne
+def apply_calibration(df, table):
+    df = df.copy()
+    timestamps = time_index(df).asi8
+    for sensor, fits in table.groupby('sensor', sort=False):
+        fits = fits.sort_values('period')
+        periods = pd.DatetimeIndex(fits['period']).asi8
+        ends = pd.DatetimeIndex(fits['end']).asi8
+
+        position = np.searchsorted(periods, timestamps, side='right') - 1
+        found = (position >= 0) & (timestamps < ends[position.clip(0)])
+        slope = np.where(found, fits['slope'].to_numpy()[position.clip(0)], np.nan)
+        intercept = np.where(found, fits['intercept'].to_numpy()[position.clip(0)], np.nan)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df[f"{sensor}_calibrated"] = (df[sensor].to_numpy(dtype='float64') - intercept) / slope
+    return df
@@ -0,0 +1,36 @@
+import pandas as pd
+
+# Format des timestamps écrits par le logger (ex. 2024_03_07_09_05_02)
+TIMESTAMP_FORMAT = '%Y_%m_%d_%H_%M_%S'
+
+# Motif compatible RE2 pour que pandas puisse déléguer la substitution à pyarrow
+# (les lookbehind/lookahead forcent un repli sur le module re, bien plus lent)
+SINGLE_DIGIT_FIELD = r'_(\d)(_|$)'
+TIMESTAMP_FIELDS = r'^(\d{4})_(\d{2})_(\d{2})_(\d{2})_(\d{2})_(\d{2})$'
+
+
+# Ajouter un zéro devant chaque champ à un seul chiffre (ex. 2024_3_7_9_5_2 -> 2024_03_07_09_05_02)
+# Deux passes car deux champs consécutifs partagent le séparateur '_'
+def fix_timestamp_format(timestamps):
+    for _ in range(2):
+        timestamps = timestamps.str.replace(SINGLE_DIGIT_FIELD, r'_0\1\2', regex=True)
+    return timestamps
+
+
+# Nettoyer et valider la colonne des timestamps en une seule passe
+# Retourne le DataFrame des lignes valides (timestamps convertis en datetime)
+# et la liste des (numéro de ligne, timestamp) invalides
+def clean_timestamps(df, column='horodatage'):
+    fixed = fix_timestamp_format(df[column])
+
+    # Réécrire en ISO 8601 pour profiter du parseur rapide de pandas ;
+    # les valeurs qui ne correspondent pas au motif restent invalides et deviennent NaT
+    iso = fixed.str.replace(TIMESTAMP_FIELDS, r'\1-\2-\3 \4:\5:\6', regex=True)
+    parsed = pd.to_datetime(iso, format='%Y-%m-%d %H:%M:%S', errors='coerce')
+
+    invalid_mask = parsed.isna().to_numpy()
+    invalid_timestamps = list(zip(df.index[invalid_mask].tolist(), fixed[invalid_mask].tolist()))
+
+    df_cleaned = df.loc[~invalid_mask].copy()
+    df_cleaned[column] = parsed[~invalid_mask]
+    return df_cleaned, invalid_timestamps
@@ -0,0 +1,107 @@
+import numpy as np
+
+# Nombre maximal de points envoyés à Plotly pour chaque trace
+MAX_POINTS = 4000
+
+# Méthodes disponibles : 'm4' garde premier/dernier/min/max de chaque paquet de points (pics conservés),
+# 'lttb' (Largest Triangle Three Buckets) garde le point le plus significatif visuellement de chaque paquet
+METHODS = ('m4', 'lttb')
+
+
+# Convertir l'axe x (datetime ou numérique) en float64 pour les calculs
+def to_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').view('int64')
+    return x.astype('float64')
+
+
+# M4 : pour chaque paquet de points consécutifs, garder le premier, le dernier, le min et le max
+# Les paquets ont le même nombre de points (et non la même durée) pour que le budget soit
+# entièrement utilisé même quand l'échantillonnage est irrégulier
+def m4_indices(x, y, n_out):
+    n = len(y)
+    n_buckets = max(n_out // 4, 1)
+    if n <= n_out:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+
+    # Indice de la première occurrence du min et du max dans chaque paquet
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    at_min = np.flatnonzero(y == mins[group])
+    at_max = np.flatnonzero(y == maxs[group])
+    argmin = at_min[np.unique(group[at_min], return_index=True)[1]]
+    argmax = at_max[np.unique(group[at_max], return_index=True)[1]]
+
+    return np.unique(np.concatenate([starts, ends, argmin, argmax]))
+
+
+# LTTB : le premier et le dernier point sont gardés, puis dans chaque paquet le point formant
+# le plus grand triangle avec le point retenu précédemment et la moyenne du paquet suivant
+def lttb_indices(x, y, n_out):
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+# Indices des points à garder pour une trace
+# Les segments séparés par des NaN (insérés par gaps.insert_gaps) sont réduits séparément,
+# et un NaN est conservé entre deux segments pour que la coupure reste visible (connectgaps=False)
+def downsample_indices(x, y, max_points=MAX_POINTS, method='m4'):
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    if not max_points or n <= max_points:
+        return np.arange(n)
+
+    x = to_float(x)
+    reduce = m4_indices if method == 'm4' else lttb_indices
+
+    finite = np.isfinite(y)
+    edges = np.diff(np.r_[0, finite.astype(np.int8), 0])
+    seg_starts = np.flatnonzero(edges == 1)
+    seg_ends = np.flatnonzero(edges == -1)
+
+    # Un seul NaN par coupure suffit
+    gap_starts = seg_ends[seg_ends < n]
+    if not finite[0]:
+        gap_starts = np.r_[0, gap_starts]
+
+    total = max(int(finite.sum()), 1)
+    pieces = [gap_starts]
+    for start, end in zip(seg_starts, seg_ends):
+        budget = max(4, int(max_points * (end - start) / total))
+        pieces.append(start + reduce(x[start:end], y[start:end], budget))
+
+    return np.unique(np.concatenate(pieces))
+
+
+# Arguments x/y prêts pour go.Scatter, réduits à max_points points au plus
+def downsample_trace(x, y, max_points=MAX_POINTS, method='m4'):
+    idx = downsample_indices(x, y, max_points, method)
+    if len(idx) == len(y):
+        return dict(x=x, y=y)
+    return dict(x=np.asarray(x)[idx], y=np.asarray(y, dtype='float64')[idx])
@@ -0,0 +1,140 @@
+import numpy as np
+
+from downsample import MAX_POINTS, downsample_indices
+
+# plotly n'est importé qu'à la construction du premier graphique : les constantes de ce module
+# peuvent être lues par les scripts sans payer l'import de plotly (lent) sur le chemin d'ingestion
+
+# Au-delà de ce nombre de points, une trace est rendue en WebGL (go.Scattergl) plutôt qu'en SVG
+WEBGL_THRESHOLD = 100_000
+
+# Au-delà de ce nombre de points GPS, la carte affiche une densité au lieu d'un marqueur par point
+MAP_DENSITY_THRESHOLD = 50_000
+
+# Groupes de capteurs du logger (fichiers TXT de justplot.py) : un graphique par groupe
+SENSOR_GROUPS = [
+    {'name': 'PM', 'title': 'Données PM', 'yaxis_title': 'Concentration (ug/m3)',
+     'columns': ['PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)']},
+    {'name': 'N', 'title': 'Données N', 'yaxis_title': 'Nombre de particules (#/cm3)',
+     'columns': ['N0.3(#/cm3)', 'N0.5(#/cm3)', 'N1(#/cm3)', 'N2.5(#/cm3)', 'N5(#/cm3)', 'N10(#/cm3)']},
+    {'name': 'T', 'title': 'Données de température', 'yaxis_title': 'Température (°C)',
+     'columns': ['T_DPS310(C)', 'T_AM2320_EXT(C)']},
+    {'name': 'H', 'title': "Données d'humidité", 'yaxis_title': 'Humidité (%)',
+     'columns': ['H_HDC1080(%)', 'H_AM2320_EXT(%)']},
+    {'name': 'P', 'title': 'Données de pression', 'yaxis_title': 'Pression (Pa)',
+     'columns': ['P_DPS310(Pa)']},
+    {'name': 'battery', 'title': 'Données de batterie', 'yaxis_title': 'Niveau de batterie (%)',
+     'columns': ['battery level']},
+]
+
+# Boutons de sélection de plage des graphiques temporels
+RANGE_SELECTOR = dict(
+    buttons=[
+        dict(count=1, label="1h", step="hour", stepmode="backward"),
+        dict(count=6, label="6h", step="hour", stepmode="backward"),
+        dict(count=1, label="1j", step="day", stepmode="backward"),
+        dict(step="all")
+    ]
+)
+
+
+# Créer une trace go.Scatter, ou go.Scattergl si elle dépasse webgl_threshold points
+# Les autres arguments (mode, name, connectgaps...) sont transmis tels quels
+def scatter_trace(x, y, webgl_threshold=WEBGL_THRESHOLD, **kwargs):
+    import plotly.graph_objects as go
+    trace_type = go.Scattergl if webgl_threshold and len(y) > webgl_threshold else go.Scatter
+    return trace_type(x=x, y=y, **kwargs)
+
+
+# Indices communs à toutes les colonnes : union des points retenus pour chaque colonne,
+# pour que toutes les traces partagent un seul tableau de timestamps
+def shared_indices(x, df, columns, max_points=MAX_POINTS, method='m4'):
+    if not max_points or len(df) <= max_points:
+        return np.arange(len(df))
+    budget = max(max_points // len(columns), 4)
+    return np.unique(np.concatenate([
+        downsample_indices(x, df[col].to_numpy(dtype='float64'), budget, method) for col in columns
+    ]))
+
+
+# Garder les colonnes présentes dans df, et les groupes qui en ont au moins une
+def available_groups(df, groups):
+    groups = [dict(group, columns=[col for col in group['columns'] if col in df.columns]) for group in groups]
+    return [group for group in groups if group['columns']]
+
+
+# Un seul tableau de timestamps réduit, partagé par toutes les traces de tous les graphiques
+def shared_x(df, groups, x=None, max_points=MAX_POINTS, method='m4'):
+    x = df.index if x is None else x
+    idx = shared_indices(x, df, [col for group in groups for col in group['columns']], max_points, method)
+    return np.asarray(x)[idx], idx
+
+
+def time_xaxis(rangeselector=True):
+    if not rangeselector:
+        return {}
+    return dict(rangeselector=RANGE_SELECTOR, rangeslider=dict(visible=True), type="date")
+
+
+# Parties à tracer : (appareil, données, axe des temps) ; une seule partie sans device_column,
+# sinon une par appareil (données fusionnées de plusieurs loggers, voir timeline.py)
+def device_parts(df, x=None, device_column=None):
+    if device_column is None:
+        return [(None, df, x)]
+    return [(device, part, None) for device, part in df.groupby(device_column, sort=False, observed=True)]
+
+
+def trace_name(col, device):
+    return col if device is None else f"{col} - {device}"
+
+
+# Construire un graphique par groupe de capteurs
+# x : axe des temps (par défaut l'index de df) ; les colonnes absentes de df sont ignorées
+# device_column : superposer une trace par appareil pour chaque colonne
+def build_figures(df, groups, title_suffix, x=None, max_points=MAX_POINTS, method='m4',
+                  webgl_threshold=WEBGL_THRESHOLD, rangeselector=True, device_column=None):
+    import plotly.graph_objects as go
+    groups = available_groups(df, groups)
+    figures = [go.Figure() for _ in groups]
+
+    for device, part, part_x in device_parts(df, x, device_column):
+        x_shared, idx = shared_x(part, groups, part_x, max_points, method)
+        for fig, group in zip(figures, groups):
+            for col in group['columns']:
+                fig.add_trace(scatter_trace(x_shared, part[col].to_numpy(dtype='float64')[idx], webgl_threshold,
+                                            mode='lines', name=trace_name(col, device), connectgaps=False))
+
+    for fig, group in zip(figures, groups):
+        fig.update_layout(
+            title=f"{group['title']} - {title_suffix}",
+            xaxis_title='Temps',
+            yaxis_title=group['yaxis_title'],
+            hovermode='x unified',
+            xaxis=time_xaxis(rangeselector)
+        )
+    return figures
+
+
+# Construire un seul graphique avec un sous-graphique par groupe et l'axe des temps partagé
+def build_subplots(df, groups, title, x=None, max_points=MAX_POINTS, method='m4', webgl_threshold=WEBGL_THRESHOLD,
+                   device_column=None):
+    from plotly.subplots import make_subplots
+    groups = available_groups(df, groups)
+
+    fig = make_subplots(rows=len(groups), cols=1, shared_xaxes=True, vertical_spacing=0.02,
+                        subplot_titles=[group['title'] for group in groups])
+    for device, part, part_x in device_parts(df, x, device_column):
+        x_shared, idx = shared_x(part, groups, part_x, max_points, method)
+        for row, group in enumerate(groups, 1):
+            for col in group['columns']:
+                fig.add_trace(scatter_trace(x_shared, part[col].to_numpy(dtype='float64')[idx], webgl_threshold,
+                                            mode='lines', name=trace_name(col, device), connectgaps=False),
+                              row=row, col=1)
+
+    for row, group in enumerate(groups, 1):
+        fig.update_yaxes(title_text=group['yaxis_title'], row=row, col=1)
+    fig.update_layout(title=title, hovermode='x unified', height=300 * len(groups))
+    fig.update_xaxes(rangeselector=RANGE_SELECTOR, row=1, col=1)
+    fig.update_xaxes(title_text='Temps', rangeslider=dict(visible=True, thickness=0.03), type="date",
+                     row=len(groups), col=1)
+    return fig
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Coupures des courbes : au-delà d'un écart de MAX_GAP entre deux mesures consécutives, une ligne de NaN
+# est insérée juste après la dernière mesure avant l'écart, pour que plotly ne relie pas les deux points
+# (connectgaps=False). Les mesures réelles sont toutes conservées.
+
+MAX_GAP = '5min'
+
+# Décalage de la ligne de coupure après la dernière mesure avant l'écart
+BREAK_OFFSET = pd.Timedelta(1, 'ns')
+
+
+# Écarts de temps détectés, sous forme de table d'intervalles : start (dernière mesure avant l'écart),
+# end (première mesure après) et duration ; index est trié
+def find_gaps(index, max_gap=MAX_GAP):
+    ns = pd.DatetimeIndex(index).asi8
+    diffs = np.diff(ns)
+    positions = np.flatnonzero(diffs > pd.Timedelta(max_gap).value)
+    return pd.DataFrame({
+        'start': pd.to_datetime(ns[positions]),
+        'end': pd.to_datetime(ns[positions + 1]),
+        'duration': pd.to_timedelta(diffs[positions]),
+    })
+
+
+# Masque des timestamps situés strictement à l'intérieur d'un écart de la table (recherche dichotomique)
+# Permet à une agrégation d'ignorer les fenêtres qui tombent dans un écart sans parcourir les données
+# (voir pyramid.aggregate) ; les mesures qui bornent l'écart (start, end) n'en font pas partie
+def in_gaps(timestamps, gaps):
+    ns = pd.DatetimeIndex(timestamps).asi8
+    starts = pd.DatetimeIndex(gaps['start']).asi8
+    ends = pd.DatetimeIndex(gaps['end']).asi8
+    position = np.searchsorted(starts, ns, side='left') - 1
+    found = position >= 0
+    return found & (ns < ends[position.clip(0)])
+
+
+# Insérer une ligne de coupure après chaque écart trop grand, en une seule opération
+# max_gap : seuil par défaut ; column_gaps : seuils propres à certaines colonnes ({colonne: seuil})
+# Une ligne de coupure reprend les valeurs de la mesure précédente, avec NaN dans les colonnes dont le seuil
+# est dépassé : les autres colonnes restent reliées. Les colonnes entières deviennent float32 s'il y a des coupures.
+# Le DataFrame d'origine n'est pas modifié ; il doit être trié par horodatage
+def insert_gaps(df, max_gap=MAX_GAP, column_gaps=None):
+    if 'horodatage' in df.columns:
+        df = df.set_index(pd.DatetimeIndex(pd.to_datetime(df['horodatage']))).drop(columns=['horodatage'])
+
+    column_gaps = column_gaps or {}
+    thresholds = {col: pd.Timedelta(column_gaps.get(col, max_gap)).value
+                  for col in df.select_dtypes(include=['number']).columns}
+    if not thresholds or len(df) < 2:
+        return df
+
+    diffs = np.diff(df.index.asi8)
+    positions = np.flatnonzero(diffs > min(thresholds.values()))
+    if not len(positions):
+        return df
+
+    breaks = df.iloc[positions].copy()
+    breaks.index = breaks.index + BREAK_OFFSET
+    breaks = breaks.astype({col: 'float32' for col in thresholds if df[col].dtype.kind in 'iub'})
+    for col, threshold in thresholds.items():
+        breaks[col] = breaks[col].mask(diffs[positions] > threshold)
+
+    # Chaque ligne de coupure se place juste après la ligne qu'elle copie
+    combined = pd.concat([df, breaks])
+    order = np.insert(np.arange(len(df)), positions + 1, len(df) + np.arange(len(positions)))
+    return combined.iloc[order]
@@ -0,0 +1,160 @@
+import re
+from contextlib import nullcontext
+from itertools import islice
+
+import pandas as pd
+
+from cleaning import TIMESTAMP_FORMAT, clean_timestamps
+from output import csv_writer, write_frame
+from profiling import stage
+from qa import add_counts, qa_counts
+from schema import SCHEMAS, convert_column, match_schema, schema_dtypes
+
+# Lignes "XX_XX_XX.CSV" insérées par le logger à chaque nouveau fichier
+MARKER_PATTERN = re.compile(r'^\d{2}_\d{2}_\d{2}\.CSV$')
+
+# Regex pour correspondre au bon format de timestamp
+TIMESTAMP_PATTERN = re.compile(r'^\d{4}_\d{1,2}_\d{1,2}_\d{1,2}_\d{1,2}_\d{1,2}$')
+
+# Nombre de lignes converties en DataFrame à la fois : borne la mémoire utilisée par l'ingestion
+CHUNK_SIZE = 100_000
+
+
+# Compteurs remplis au fil de l'ingestion (mêmes informations que celles écrites dans resultats.txt)
+def new_stats():
+    return {
+        'expected_field_count': None,
+        'total_lines': 0,
+        'incorrect_lines': 0,
+        'invalid_timestamp_count': 0,
+        'processed_lines': 0,
+        'valid_lines': 0,
+        'invalid_timestamps': [],
+        # Compteurs du contrôle qualité par colonne (voir qa.py)
+        'qa': {},
+        # Position (en octets) de la fin de la dernière ligne lue : le mode suivi reprend la lecture à cet endroit
+        'offset': 0,
+    }
+
+
+# Lire le fichier ligne par ligne en ignorant les lignes vides, les commentaires et les marqueurs "XX_XX_XX.CSV"
+# Si stats est fourni, la lecture commence à stats['offset'] et l'avance au fil des lignes lues
+# follow : une dernière ligne sans fin de ligne est en cours d'écriture et sera lue au prochain passage
+def iter_lines(file_path, stats=None, follow=False):
+    with open(file_path, 'rb') as file:
+        if stats is not None:
+            file.seek(stats['offset'])
+        for raw in file:
+            if follow and not raw.endswith(b'\n'):
+                break
+            if stats is not None:
+                stats['offset'] += len(raw)
+            line = raw.decode(errors='replace')
+            if not line.strip() or line.startswith('#'):
+                continue
+            line = line.strip().replace(';', ',')
+            if MARKER_PATTERN.match(line):
+                continue
+            yield line
+
+
+# Filtrer les lignes avec un mauvais nombre de champs ou des timestamps incorrects
+# Les champs vides restent vides : ils deviennent NaN (0 pour les colonnes entières) à la conversion,
+# au lieu de fausses mesures nulles, et sont comptés par le contrôle qualité
+def iter_valid_rows(lines, stats):
+    for line in lines:
+        stats['total_lines'] += 1
+        fields = line.split(',')
+
+        # Déterminer le nombre attendu de champs à partir de la première ligne valide
+        if stats['expected_field_count'] is None:
+            stats['expected_field_count'] = len(fields)
+
+        if len(fields) == stats['expected_field_count'] and TIMESTAMP_PATTERN.match(fields[0]):
+            yield fields
+        else:
+            if not TIMESTAMP_PATTERN.match(fields[0]):
+                print(f"Ligne {stats['total_lines']} a un timestamp invalide : {fields[0]}")
+                stats['invalid_timestamp_count'] += 1
+            else:
+                print(f"Ligne {stats['total_lines']} a un nombre incorrect de champs : {len(fields)}")
+            stats['incorrect_lines'] += 1
+
+
+# Convertir un paquet de lignes en DataFrame typé indexé par 'horodatage' (et compter ses défauts, voir qa.py)
+def build_chunk(rows, columns, dtype_dict, stats):
+    if len(rows[0]) > len(columns):
+        raise ValueError(f"Les lignes ont {len(rows[0])} champs mais l'en-tête n'en décrit que {len(columns)}")
+
+    start = stats['processed_lines']
+    chunk = pd.DataFrame(rows, columns=columns[:len(rows[0])], index=pd.RangeIndex(start, start + len(rows)))
+    stats['processed_lines'] += len(rows)
+
+    chunk, invalid_timestamps = clean_timestamps(chunk)
+    stats['invalid_timestamps'].extend(invalid_timestamps)
+    stats['valid_lines'] += len(chunk)
+
+    chunk = chunk.set_index('horodatage')
+    numeric = [col for col in chunk.columns if dtype_dict.get(col, 'str') != 'str']
+    for col in numeric:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+    # Contrôle qualité avant le typage : les valeurs absentes des colonnes entières sont encore NaN
+    with stage('qualite', len(chunk)):
+        add_counts(stats.setdefault('qa', {}), qa_counts(chunk))
+
+    for col in numeric:
+        chunk[col] = convert_column(chunk[col], dtype_dict[col])
+    return chunk
+
+
+# Ingestion en une seule passe : produit des DataFrames typés d'au plus chunk_size lignes
+def iter_chunks(file_path, columns, dtype_dict, stats, chunk_size=CHUNK_SIZE, follow=False):
+    valid_rows = iter_valid_rows(iter_lines(file_path, stats, follow), stats)
+    while True:
+        with stage('lecture') as info:
+            rows = list(islice(valid_rows, chunk_size))
+            info['rows'] = len(rows)
+        if not rows:
+            return
+        with stage('nettoyage', len(rows)):
+            chunk = build_chunk(rows, columns, dtype_dict, stats)
+        yield chunk
+
+
+# Ingérer tout le fichier ; le CSV nettoyé n'est écrit que si csv_path est fourni, au fur et à mesure
+# des paquets (aucune relecture du CSV), compressé selon son extension (.gz, .zst) ; voir output.py
+# Avec les stats d'une ingestion précédente, seules les lignes ajoutées depuis sont lues (et ajoutées au CSV)
+def ingest_file(file_path, columns, dtype_dict, csv_path=None, chunk_size=CHUNK_SIZE, stats=None, follow=False):
+    resume = stats is not None
+    stats = stats if resume else new_stats()
+    chunks = []
+    with csv_writer(csv_path, append=resume, sep=',') if csv_path else nullcontext() as writer:
+        for chunk in iter_chunks(file_path, columns, dtype_dict, stats, chunk_size, follow):
+            if writer:
+                with stage('csv', len(chunk)):
+                    write_frame(writer, chunk)
+            chunks.append(chunk)
+
+    if chunks:
+        df = pd.concat(chunks)
+    else:
+        df = pd.DataFrame(columns=columns).set_index('horodatage')
+    return df, stats
+
+
+# Reconnaître le format du fichier (voir schema.SCHEMAS) à partir de sa première ligne valide
+def detect_schema(file_path):
+    for line in iter_lines(file_path):
+        return SCHEMAS[match_schema(line.split(','))]
+    raise ValueError(f"Aucune ligne de données dans {file_path}")
+
+
+# Lire un fichier CSV déjà propre (en-tête et séparateur du schéma), typé et indexé par 'horodatage'
+def read_csv_file(file_path, schema):
+    dtypes = schema_dtypes(schema)
+    df = pd.read_csv(file_path, sep=schema['delimiter'], header=0 if schema['header'] else None,
+                     names=None if schema['header'] else list(dtypes),
+                     dtype={col: dtype for col, dtype in dtypes.items() if dtype != 'str'})
+    df['horodatage'] = pd.to_datetime(df['horodatage'], format=TIMESTAMP_FORMAT)
+    return df.set_index('horodatage')
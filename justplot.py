@@ -1,230 +1,70 @@
+import argparse
 import os
-import pandas as pd
-import re
-import plotly.graph_objects as go
-import plotly.express as px
-import plotly.io as pio
-
-# Choisir 'browser' comme mode de rendu par défaut
-pio.renderers.default = 'browser'
-
-# Lister les fichiers TXT dans le répertoire courant
-txt_files = [f for f in os.listdir() if f.endswith('.txt')]
-
-# Si aucun fichier TXT n'est trouvé, afficher un message d'erreur
-if not txt_files:
-    print("Aucun fichier TXT trouvé dans le répertoire actuel.")
-    exit()
-
-# Afficher les fichiers disponibles et demander à l'utilisateur d'en choisir un
-print("Fichiers TXT disponibles :")
-for i, file in enumerate(txt_files, 1):
-    print(f"{i}. {file}")
-
-choice = int(input("Sélectionnez un fichier par son numéro : ")) - 1
-file_path = txt_files[choice]
-
-# Extraire le nom de base du fichier sans l'extension
-base_name = os.path.splitext(file_path)[0]
-
-# Générer les noms de fichiers de sortie
-csv_file_path = f"{base_name}.csv"
-averaged_csv_file_path = f"{base_name}_averaged.csv"
-
-# Ouvrir le fichier sélectionné et le convertir en CSV
-with open(file_path, 'r') as file:
-    lines = [line.strip().replace(';', ',') for line in file if line.strip() and not line.startswith('#')]
-
-# Retirer les lignes qui correspondent au pattern "XX_XX_XX.CSV"
-pattern = re.compile(r'^\d{2}_\d{2}_\d{2}\.CSV$')
-lines = [line for line in lines if not pattern.match(line)]
-
-# Déterminer le nombre attendu de champs à partir de la première ligne valide
-expected_field_count = len(lines[0].split(','))
-
-# Regex pour correspondre au bon format de timestamp
-timestamp_pattern = re.compile(r'^\d{4}_\d{1,2}_\d{1,2}_\d{1,2}_\d{1,2}_\d{1,2}$')
-
-# Traiter les lignes : remplacer les champs vides par 0 et filtrer les lignes avec un mauvais nombre de champs ou des timestamps incorrects
-i = 0
-j = 0
-invalid_timestamp_count = 0
-processed_lines = []
-for line in lines:
-    i += 1
-    fields = line.split(',')
-    if len(fields) == expected_field_count and timestamp_pattern.match(fields[0]):
-        fields = ['0' if field == '' else field for field in fields]
-        processed_lines.append(','.join(fields))
-    else:
-        if not timestamp_pattern.match(fields[0]):
-            print(f"Ligne {i} a un timestamp invalide : {fields[0]}")
-            invalid_timestamp_count += 1
-        else:
-            print(f"Ligne {i} a un nombre incorrect de champs : {len(fields)}")
-        j += 1
-
-print(f"{file_path}")
-print(f"Lignes totales : {i}, Lignes incorrectes : {j}, Timestamps invalides : {invalid_timestamp_count}")
-
-# Créer un fichier txt si il n'existe pas nommée 'resultats.txt' et y ajouter les informations de traitement
-if not os.path.exists('resultats.txt'):
-    with open('resultats.txt', 'w') as f:
-        f.write(f"{file_path}\n")
-        f.write(f"Lignes totales : {i}, Lignes incorrectes : {j}, Timestamps invalides : {invalid_timestamp_count}\n")
-else:
-    with open('resultats.txt', 'a') as f:
-        f.write(f"{file_path}\n")
-        f.write(f"Lignes totales : {i}, Lignes incorrectes : {j}, Timestamps invalides : {invalid_timestamp_count}\n")
-
-
-# Ajouter la ligne d'en-tête en haut
-header = "horodatage,PM1.0(ug/m3),PM2.5(ug/m3),PM10(ug/m3),N0.3(#/cm3),N0.5(#/cm3),N1(#/cm3),N2.5(#/cm3),N5(#/cm3),N10(#/cm3),T_DPS310(C),P_DPS310(Pa),H_HDC1080(%),battery level,T_AM2320_EXT(C),H_AM2320_EXT(%),Latitude,Longitude,Altitude,vitesse(km/h),nb de satellites"
-processed_lines.insert(0, header)
-
-# Écrire les données nettoyées dans le fichier CSV
-with open(csv_file_path, 'w') as csv_file:
-    csv_file.write('\n'.join(processed_lines))
-
-# Define the data types for each column
-dtype_dict = {
-    'horodatage': 'str',
-    'PM1.0(ug/m3)': 'float64',
-    'PM2.5(ug/m3)': 'float64',
-    'PM10(ug/m3)': 'float64',
-    'N0.3(#/cm3)': 'float64',
-    'N0.5(#/cm3)': 'float64',
-    'N1(#/cm3)': 'float64',
-    'N2.5(#/cm3)': 'float64',
-    'N5(#/cm3)': 'float64',
-    'N10(#/cm3)': 'float64',
-    'T_DPS310(C)': 'float64',
-    'P_DPS310(Pa)': 'float64',
-    'H_HDC1080(%)': 'float64',
-    'battery level': 'float64',
-    'T_AM2320_EXT(C)': 'float64',
-    'H_AM2320_EXT(%)': 'float64',
-    'Latitude': 'float64',
-    'Longitude': 'float64',
-    'Altitude': 'float64',
-    'vitesse(km/h)': 'float64',
-    'nb de satellites': 'float64'
-}
-
-# Function to fix inconsistent timestamps (e.g., missing leading zero in seconds)
-def fix_timestamp_format(timestamp):
-    # Match a timestamp with a single-digit second and add a leading zero
-    timestamp_fixed = re.sub(r'_(\d{1})(?=\s|,|$)', r'_0\1', timestamp)
-    return timestamp_fixed
-
-# List to keep track of invalid timestamps
-invalid_timestamps = []
-
-# Function to clean and check timestamps
-def clean_and_check_timestamp(row, line_number):
-    try:
-        # First, try to fix the timestamp format
-        row['horodatage'] = fix_timestamp_format(row['horodatage'])
-        # Now try to convert to datetime, coercing errors
-        row['horodatage'] = pd.to_datetime(row['horodatage'], format='%Y_%m_%d_%H_%M_%S', errors='raise')
-        return row
-    except Exception:
-        # If timestamp is invalid, store the line number and timestamp value
-        invalid_timestamps.append((line_number, row['horodatage']))
-        return None  # Return None to skip this row later
-
-# Read the CSV file with specified data types and error handling
-df = pd.read_csv(
-    csv_file_path,
-    sep=',',
-    dtype=str,  # Read all columns as strings initially
-    on_bad_lines='skip'  # Skip bad lines
-)
-
-# Process each row and validate timestamps
-cleaned_rows = []
-for idx, row in df.iterrows():
-    cleaned_row = clean_and_check_timestamp(row, idx)
-    if cleaned_row is not None:
-        cleaned_rows.append(cleaned_row)
-
-# Create a new DataFrame from valid rows
-df_cleaned = pd.DataFrame(cleaned_rows)
-
-# Drop any rows with NaN in 'horodatage' (invalid timestamps will already be excluded)
-df_cleaned = df_cleaned.dropna(subset=['horodatage'])
-
-# Set 'horodatage' as the index of the DataFrame
-df_cleaned.set_index('horodatage', inplace=True)
-
-# Save the cleaned DataFrame to a new CSV file
-df_cleaned.to_csv(csv_file_path, sep=',')
-
-# Display the invalid timestamps and the number of total invalid timestamps
-print(f"Total invalid timestamps: {len(invalid_timestamps)}")
-if invalid_timestamps:
-    print("Invalid timestamps (line number, timestamp):")
-    for line_num, ts in invalid_timestamps:
-        print(f"Ligne {line_num}: {ts}")
-
-print(f"Total lignes traitées: {len(df)}")
-print(f"Lignes valides: {len(df_cleaned)}")
-
-# Ajouter une fonction pour moyenner toutes les colonnes en fonction de l'intervalle de temps choisi par l'utilisateur en secondes
-# Ajouter une fonction pour moyenner toutes les colonnes en fonction de l'intervalle de temps choisi par l'utilisateur en secondes
-def average_data(df, interval):
-    # Convertir toutes les colonnes sauf 'horodatage' en données numériques
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 
-    # Resample the data and calculate the mean for numeric columns only
-    df_avg = df.resample(f'{interval}s').mean()
+import pandas as pd
 
-    # Drop rows with NaN values after resampling
-    df_avg = df_avg.dropna()
+from cache import append_cached, load_cached, load_cached_prefix, store_cached
+from downsample import MAX_POINTS, METHODS
+from figures import (MAP_DENSITY_THRESHOLD, SENSOR_GROUPS, WEBGL_THRESHOLD, available_groups, build_figures,
+                     build_subplots)
+from gaps import MAX_GAP, find_gaps, insert_gaps
+from ingest import detect_schema, ingest_file, iter_chunks, new_stats
+from output import COMPRESSIONS, csv_writer, output_path, write_csv, write_frame
+from profiling import PROFILE_FILE, enable as enable_profiling, save_profile, stage
+from pyramid import aggregate, build_pyramid, load_or_build_pyramid
+from qa import print_qa, qa_summary, save_qa
+from query import is_query, parse_columns, parse_time, query_cached, range_suffix, select_range
+from schema import numeric_columns, schema_columns, schema_dtypes
+from serve import DEFAULT_PORT, serve
+from stream import finish_stream, new_stream, stream_chunk, stream_gaps, stream_plot_frame, stream_track
+from timeline import DEVICE_COLUMN, load_timeline, merge_sorted
+from track import STATIONARY_M, TOLERANCE_M, hexbin, simplify_track
+
+# Fichier récapitulatif des traitements
+RESULTS_FILE = 'resultats.txt'
+
+# Colonnes nécessaires à la carte
+MAP_COLUMNS = ['Latitude', 'Longitude', 'Altitude', 'vitesse(km/h)', 'nb de satellites']
+
+# Nom utilisé pour les titres et le rapport des données fusionnées (--merge)
+MERGED_NAME = 'fusion'
+
+# La moyenne est lue dans la pyramide d'agrégats (sum/count/min/max à 1s, 10s, 60s, 600s, 3600s)
+# au lieu de rééchantillonner toutes les données brutes
+def average_data(df, interval, pyramid=None, minmax=False):
+    if pyramid is None:
+        pyramid = build_pyramid(df)
+
+    # Moyenne par intervalle (et min/max par intervalle si demandé)
+    # Les fenêtres situées dans les écarts de l'enregistrement ne sont pas créées
+    index = df.index if df.index.is_monotonic_increasing else df.index.sort_values()
+    df_avg = aggregate(pyramid, interval, minmax, gaps=find_gaps(index, MAX_GAP))
+
+    # Drop rows with NaN values after resampling (fenêtres vides seulement : un capteur absent
+    # n'efface pas les moyennes des autres)
+    df_avg = df_avg.dropna(how='all')
 
     return df_avg
 
-# Demander à l'utilisateur s'il veut moyenner les données
-average_choice = input("Voulez-vous moyenner les données ? (Y/N) : ").upper()
-
-if average_choice == 'Y':
-    # Demander à l'utilisateur l'intervalle de temps pour moyenner les données en secondes
-    interval = int(input("Entrez l'intervalle de temps pour moyenner les données en secondes : "))
-    averaged_csv_file_path = f"{base_name}_averaged_{interval}sec.csv"
-    df_avg = average_data(df_cleaned, interval)
-    df_avg.to_csv(averaged_csv_file_path, sep=',')
-    print(f"Les données ont été moyennées et enregistrées dans {averaged_csv_file_path}")
-else:
-    print("Les données n'ont pas été moyennées")
-
-def insert_gaps(df, max_gap='5min'):
-    # Convertir la colonne 'horodatage' en datetime si ce n'est pas déjà fait
-    if 'horodatage' in df.columns:
-        df['horodatage'] = pd.to_datetime(df['horodatage'])
-        df.set_index('horodatage', inplace=True)
-
-    # Calculer la différence de temps entre les points consécutifs
-    df['time_diff'] = df.index.to_series().diff().shift(-1)
-
-    # Insérer des valeurs NaN où l'écart de temps dépasse la valeur max_gap
-    df_with_gaps = df.copy()
-    df_with_gaps.loc[df['time_diff'] > pd.Timedelta(max_gap)] = None
-
-    df_with_gaps = df_with_gaps.drop(columns=['time_diff'])
-    return df_with_gaps
 
 def convert_to_numeric(df, columns):
     for col in columns:
         # Convert the column to numeric, coerce errors to NaN
         df[col] = pd.to_numeric(df[col], errors='coerce')
 
-    # Drop rows where any of the specified columns have NaN values
-    df = df.dropna(subset=columns)
+    # Drop rows where all of the specified columns have NaN values
+    # (une mesure manquante reste NaN, les autres capteurs de la ligne sont tracés)
+    df = df.dropna(how='all', subset=columns)
     return df
 
-def normalize_series(series):
-    return (series - series.min()) / (series.max() - series.min())
+# minimum, maximum : bornes calculées ailleurs (sur tout le fichier en mode --stream), sinon celles de la série
+def normalize_series(series, minimum=None, maximum=None):
+    minimum = series.min() if minimum is None else minimum
+    maximum = series.max() if maximum is None else maximum
+    return (series - minimum) / (maximum - minimum)
 
 def convert_and_normalize(df, columns):
     df = convert_to_numeric(df, columns)
@@ -232,175 +72,72 @@ def convert_and_normalize(df, columns):
     #     df[col] = normalize_series(df[col])
     return df
 
-def plot_data(df):
+
+# Préparer les données pour les graphiques (tri, coupures, conversion numérique)
+# normalize=False : sans les colonnes PM normalisées, qui dépendent du min/max de toutes les données (mode suivi)
+def prepare_plot_data(df, schema, normalize=True):
     # Make sure data is sorted by horodatage before plotting
     df = df.sort_index()
 
+    # Convert necessary columns to numeric types (mesures du schéma, sans les colonnes GPS)
+    df = convert_and_normalize(df, [col for col in numeric_columns(schema) if col in df.columns])
+
     # Insert gaps in the data where time differences exceed a certain limit
-    df = insert_gaps(df, max_gap='5min')
+    # (après la conversion, qui ne supprime que les lignes sans aucune mesure)
+    df = insert_gaps(df, MAX_GAP)
 
-    # numerical columns
-    numeric_columns = ['PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)', 'N0.3(#/cm3)', 'N0.5(#/cm3)', 'N1(#/cm3)', 'N2.5(#/cm3)', 'N5(#/cm3)', 'N10(#/cm3)', 'T_DPS310(C)', 'P_DPS310(Pa)', 'H_HDC1080(%)', 'battery level', 'T_AM2320_EXT(C)', 'H_AM2320_EXT(%)']
+    if not normalize:
+        return df
 
-    # Convert necessary columns to numeric types
-    df = convert_and_normalize(df, numeric_columns)
-
-    # Normalize PM data to unify the axis scales
-    df['PM1.0(ug/m3)_normalized'] = normalize_series(df['PM1.0(ug/m3)'])
-    df['PM2.5(ug/m3)_normalized'] = normalize_series(df['PM2.5(ug/m3)'])
-    df['PM10(ug/m3)_normalized'] = normalize_series(df['PM10(ug/m3)'])
-
-
-    # PM values plot
-    fig_pm = go.Figure()
-    fig_pm.add_trace(go.Scatter(x=df.index, y=df['PM1.0(ug/m3)'], mode='lines', name='PM1.0(ug/m3)', connectgaps=False))
-    fig_pm.add_trace(go.Scatter(x=df.index, y=df['PM2.5(ug/m3)'], mode='lines', name='PM2.5(ug/m3)', connectgaps=False))
-    fig_pm.add_trace(go.Scatter(x=df.index, y=df['PM10(ug/m3)'], mode='lines', name='PM10(ug/m3)', connectgaps=False))
-    fig_pm.update_layout(
-        title=f'Données PM - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Concentration (ug/m3)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
+    # Normalize PM data to unify the axis scales (colonnes absentes avec --columns ignorées)
+    for col in ['PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)']:
+        if col in df.columns:
+            df[f'{col}_normalized'] = normalize_series(df[col])
+    return df
 
-    # N values plot
-    fig_n = go.Figure()
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N0.3(#/cm3)'], mode='lines', name='N0.3(#/cm3)', connectgaps=False))
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N0.5(#/cm3)'], mode='lines', name='N0.5(#/cm3)', connectgaps=False))
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N1(#/cm3)'], mode='lines', name='N1(#/cm3)', connectgaps=False))
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N2.5(#/cm3)'], mode='lines', name='N2.5(#/cm3)', connectgaps=False))
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N5(#/cm3)'], mode='lines', name='N5(#/cm3)', connectgaps=False))
-    fig_n.add_trace(go.Scatter(x=df.index, y=df['N10(#/cm3)'], mode='lines', name='N10(#/cm3)', connectgaps=False))
-    fig_n.update_layout(
-        title=f'Données N - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Nombre de particules (#/cm3)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
 
-    # Temperature plot
-    fig_temp = go.Figure()
-    fig_temp.add_trace(go.Scatter(x=df.index, y=df['T_DPS310(C)'], mode='lines', name='T_DPS310(C)', connectgaps=False))
-    fig_temp.add_trace(go.Scatter(x=df.index, y=df['T_AM2320_EXT(C)'], mode='lines', name='T_AM2320_EXT(C)', connectgaps=False))
-    fig_temp.update_layout(
-        title=f'Données de température - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Température (°C)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
+# device_column : données fusionnées de plusieurs loggers (voir timeline.py), une trace par logger
+def plot_data(df, file_path, schema, max_points=MAX_POINTS, method='m4', webgl_threshold=WEBGL_THRESHOLD,
+              combined=False, device_column=None):
+    with stage('preparation', len(df)):
+        if device_column is None:
+            df = prepare_plot_data(df, schema)
+        else:
+            # Coupures et normalisation calculées séparément pour chaque logger
+            df = merge_sorted([prepare_plot_data(part, schema)
+                               for _, part in df.groupby(device_column, sort=False, observed=True)])
 
-    # Humidity plot
-    fig_hum = go.Figure()
-    fig_hum.add_trace(go.Scatter(x=df.index, y=df['H_HDC1080(%)'], mode='lines', name='H_HDC1080(%)', connectgaps=False))
-    fig_hum.add_trace(go.Scatter(x=df.index, y=df['H_AM2320_EXT(%)'], mode='lines', name='H_AM2320_EXT(%)', connectgaps=False))
-    fig_hum.update_layout(
-        title=f'Données d\'humidité - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Humidité (%)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
+    return plot_figures(df, file_path, max_points, method, webgl_threshold, combined, device_column)
 
-    # Pressure plot
-    fig_press = go.Figure()
-    fig_press.add_trace(go.Scatter(x=df.index, y=df['P_DPS310(Pa)'], mode='lines', name='P_DPS310(Pa)', connectgaps=False))
-    fig_press.update_layout(
-        title=f'Données de pression - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Pression (Pa)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
 
-    fig_batt = go.Figure()
-    fig_batt.add_trace(go.Scatter(x=df.index, y=df['battery level'], mode='lines', name='battery level', connectgaps=False))
-    fig_batt.update_layout(
-        title=f'Données de batterie - {file_path}',
-        xaxis_title='Temps',
-        yaxis_title='Niveau de batterie (%)',
-        hovermode='x unified',
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, label="1h", step="hour", stepmode="backward"),
-                    dict(count=6, label="6h", step="hour", stepmode="backward"),
-                    dict(count=1, label="1j", step="day", stepmode="backward"),
-                    dict(step="all")
-                ]
-            ),
-            rangeslider=dict(visible=True),
-            type="date"
-        )
-    )
+# Chaque trace est réduite à max_points points (min/max conservés avec M4, coupures NaN respectées)
+# et passe en rendu WebGL au-delà de webgl_threshold points
+def plot_figures(df, file_path, max_points=MAX_POINTS, method='m4', webgl_threshold=WEBGL_THRESHOLD,
+                 combined=False, device_column=None):
+    with stage('figures', len(df)):
+        if combined:
+            return [build_subplots(df, SENSOR_GROUPS, f'Données - {file_path}', None, max_points, method,
+                                   webgl_threshold, device_column)]
+        return build_figures(df, SENSOR_GROUPS, file_path, None, max_points, method, webgl_threshold,
+                             device_column=device_column)
+
+
+def print_track_reduction(points, kept):
+    print(f"Carte : {points} points GPS réduits à {kept} ({100 * (1 - kept / points):.1f} % retirés)")
 
-    # Afficher les figures
-    fig_pm.show()
-    fig_n.show()
-    fig_temp.show()
-    fig_hum.show()
-    fig_press.show()
-    fig_batt.show()
 
+# tolerance : écart maximal (m) de la trace simplifiée (0 pour garder tous les points)
+# hex_size : taille (m) des cellules hexagonales où PM2.5 est moyenné, au lieu de tracer le trajet
+# simplify : False pour une trace déjà simplifiée (--stream, voir stream.py)
+def plot_map(df, density_threshold=MAP_DENSITY_THRESHOLD, tolerance=TOLERANCE_M, hex_size=None, simplify=True):
+    missing = [col for col in MAP_COLUMNS if col not in df.columns]
+    if missing:
+        print(f"Carte impossible, colonnes absentes : {', '.join(missing)}")
+        return None
+
+    # plotly.express est lent à importer et ne sert qu'à la carte
+    import plotly.express as px
 
-def plot_map(df):
     # Convert necessary columns to numeric types
     df['Latitude'] = pd.to_numeric(df['Latitude'], errors='coerce')
     df['Longitude'] = pd.to_numeric(df['Longitude'], errors='coerce')
@@ -414,7 +151,53 @@ def plot_map(df):
 
     if df.empty:
         print("Aucune donnée valide pour afficher sur la carte.")
-        return
+        return None
+
+    if hex_size and 'PM2.5(ug/m3)' not in df.columns:
+        print("Carte par cellules impossible sans la colonne PM2.5(ug/m3) : la trace GPS est affichée")
+        hex_size = None
+
+    if hex_size:
+        with stage('hexbin', len(df)):
+            cells = hexbin(df, 'PM2.5(ug/m3)', hex_size)
+        print(f"Carte : {len(df)} points GPS agrégés en {len(cells)} cellules de {hex_size} m")
+        return px.scatter_mapbox(
+            cells,
+            lat='Latitude',
+            lon='Longitude',
+            color='PM2.5(ug/m3)',
+            size='count',
+            hover_data={'min': True, 'max': True, 'count': True},
+            zoom=10,
+            mapbox_style="open-street-map",
+            title=f"PM2.5 moyen par cellule de {hex_size} m"
+        )
+
+    # Retirer les points immobiles et simplifier la trace (chaque logger séparément après --merge)
+    if simplify:
+        points = len(df)
+        with stage('trace_gps', points):
+            if DEVICE_COLUMN in df.columns:
+                df = pd.concat([simplify_track(part, tolerance, STATIONARY_M if tolerance else 0)
+                                for _, part in df.groupby(DEVICE_COLUMN, sort=False, observed=True)])
+            else:
+                df = simplify_track(df, tolerance, STATIONARY_M if tolerance else 0)
+        print_track_reduction(points, len(df))
+
+    # Trajets longs : carte de densité (une seule couche WebGL) au lieu d'un marqueur par point
+    if density_threshold and len(df) > density_threshold:
+        fig = px.density_mapbox(
+            df,
+            lat='Latitude',
+            lon='Longitude',
+            z='vitesse(km/h)',
+            radius=5,
+            hover_data={'vitesse(km/h)': True, 'Altitude': True, 'nb de satellites': True},
+            zoom=10,
+            mapbox_style="open-street-map",
+            title="Trajectoire et Données GPS"
+        )
+        return fig
 
     # Créer une carte avec les données GPS
     fig = px.scatter_mapbox(
@@ -429,22 +212,532 @@ def plot_map(df):
         mapbox_style="open-street-map",
         title="Trajectoire et Données GPS"
     )
+    return fig
+
+
+# Ouvrir les figures dans le navigateur, ou les écrire dans <fichier>_rapport.html si report est demandé
+def show_figures(figures, file_path, report=False):
+    if not figures:
+        return
+    # Les modules de rendu ne sont importés que s'il y a des graphiques à afficher
+    import plotly.io as pio
+    from report import output_sections
+
+    # Choisir 'browser' comme mode de rendu par défaut
+    pio.renderers.default = 'browser'
+    report_path = f"{os.path.splitext(file_path)[0]}_rapport.html" if report else None
+    with stage('affichage'):
+        output_sections([(file_path, figures)], f'Données - {file_path}', report_path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Nettoyage et tracé des fichiers TXT du logger. "
+                                                 "Les choix non fournis en option sont demandés interactivement.")
+    parser.add_argument('--file', help="Fichier TXT à traiter (au lieu de le choisir dans la liste)")
+    parser.add_argument('--choice', type=int, help="Numéro du fichier dans la liste des fichiers TXT")
+    parser.add_argument('--batch', action='store_true',
+                        help="Traiter tous les fichiers TXT du répertoire, sans aucune question")
+    parser.add_argument('--merge', action='store_true',
+                        help="Charger tous les fichiers TXT en parallèle et les tracer sur les mêmes axes")
+    parser.add_argument('--workers', type=int, default=None, help="Nombre de processus en mode batch ou fusion")
+    parser.add_argument('--average', type=int, metavar='SECONDES', help="Moyenner les données sur cet intervalle")
+    parser.add_argument('--no-average', action='store_true', help="Ne pas moyenner les données")
+    parser.add_argument('--minmax', action='store_true',
+                        help="Ajouter le min et le max de chaque intervalle au fichier moyenné")
+    parser.add_argument('--compress', choices=COMPRESSIONS,
+                        help="Compresser les CSV nettoyés et moyennés "
+                             "(.csv.gz, ou .csv.zst avec le module zstandard)")
+    parser.add_argument('--plot', action=argparse.BooleanOptionalAction, help="Tracer les données")
+    parser.add_argument('--map', action=argparse.BooleanOptionalAction, help="Afficher les données sur une carte")
+    parser.add_argument('--no-cache', action='store_true', help="Ignorer le cache et relire le fichier TXT")
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS,
+                        help="Nombre maximal de points par trace (0 pour tout tracer)")
+    parser.add_argument('--downsample', choices=METHODS, default='m4', help="Méthode de réduction des traces")
+    parser.add_argument('--webgl-threshold', type=int, default=WEBGL_THRESHOLD,
+                        help="Nombre de points au-delà duquel une trace est rendue en WebGL (0 pour jamais)")
+    parser.add_argument('--map-density-threshold', type=int, default=MAP_DENSITY_THRESHOLD,
+                        help="Nombre de points GPS au-delà duquel la carte affiche une densité (0 pour jamais)")
+    parser.add_argument('--map-tolerance', type=float, default=TOLERANCE_M,
+                        help="Écart maximal en mètres entre la trace simplifiée de la carte et les points retirés "
+                             "(0 pour garder tous les points)")
+    parser.add_argument('--map-hex', type=float, metavar='METRES',
+                        help="Afficher PM2.5 moyenné par cellules hexagonales de cette taille au lieu du trajet")
+    parser.add_argument('--combined', action='store_true',
+                        help="Un seul graphique avec un sous-graphique par capteur et l'axe des temps partagé")
+    parser.add_argument('--report', action='store_true',
+                        help="Écrire les graphiques dans un seul rapport HTML (<fichier>_rapport.html) "
+                             "au lieu d'ouvrir un onglet par graphique")
+    parser.add_argument('--serve', action='store_true',
+                        help="Tracer via un serveur local qui recharge les points de la plage zoomée")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port du serveur local (--serve)")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"Mesurer la durée, le nombre de lignes et la mémoire de chaque étape ({PROFILE_FILE}, "
+                             "à côté de resultats.txt ; en mode batch, seul le processus principal est mesuré)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Avec --profile, mesurer aussi le pic de mémoire allouée par étape "
+                             "(tracemalloc, plus lent)")
+    parser.add_argument('--cprofile', metavar='ETAPE',
+                        help="Avec --profile, enregistrer le profil cProfile d'une étape (ex. ingestion/lecture) "
+                             "dans profil_<étape>.prof")
+    parser.add_argument('--follow', action='store_true',
+                        help="Suivre le fichier pendant son écriture par le logger : seules les nouvelles lignes "
+                             "sont lues et le graphique du serveur local est mis à jour (implique --serve)")
+    parser.add_argument('--interval', type=float, default=5,
+                        help="Intervalle en secondes entre deux lectures du fichier (--follow)")
+    parser.add_argument('--from', dest='start', type=parse_time, metavar='DATE',
+                        help="Ne charger que les données à partir de cette date (2024-03-07T06:00 ou "
+                             "2024_03_07_06_00_00), lues directement dans le cache")
+    parser.add_argument('--to', dest='end', type=parse_time, metavar='DATE',
+                        help="Ne charger que les données avant cette date (exclue)")
+    parser.add_argument('--columns', type=parse_columns, metavar='COL1,COL2',
+                        help="Ne charger que ces colonnes (séparées par des virgules)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Lire le fichier par paquets, en mémoire bornée, pour les fichiers plus grands que la "
+                             "mémoire : graphiques tracés depuis des moyennes, sans cache ni --serve, --merge, "
+                             "--from, --to ou --columns")
+    return parser.parse_args(argv)
+
+
+# Lister les fichiers TXT dans le répertoire courant (hors fichier récapitulatif)
+def list_txt_files():
+    return [f for f in os.listdir() if f.endswith('.txt') and f != RESULTS_FILE]
+
+
+def ask_yes_no(question):
+    return input(f"{question} (Y/N) : ").upper() == 'Y'
+
+
+# Charger le fichier nettoyé, depuis le cache si le fichier source n'a pas changé
+# En mode suivi, si le fichier a seulement grandi depuis sa mise en cache, seules les lignes ajoutées sont lues
+# (hors suivi, un fichier modifié est relu entièrement : sa fin seule est vérifiée par load_cached_prefix)
+# Retourne (df, stats, schema) ; le format du fichier est reconnu à partir de sa première ligne valide
+def load_file(file_path, no_cache=False, follow=False, compression=None):
+    schema = detect_schema(file_path)
+    columns, dtype_dict = schema_columns(schema), schema_dtypes(schema)
+    with stage('cache'):
+        df_cleaned, stats = (None, None) if no_cache else load_cached(file_path, dtype_dict)
+        prefix = df_cleaned is None and not no_cache and follow
+        if prefix:
+            df_cleaned, stats = load_cached_prefix(file_path, dtype_dict)
+    if prefix and df_cleaned is not None:
+        with stage('ingestion') as info:
+            df_cleaned, new_rows = read_new_lines(file_path, df_cleaned, stats, schema, no_cache, follow, compression)
+            info['rows'] = len(new_rows)
+        print(f"Données chargées depuis le cache pour {file_path} ({len(new_rows)} nouvelles lignes lues)")
+        return df_cleaned, stats, schema
+
+    if df_cleaned is None:
+        # Lire, filtrer, valider et typer le fichier en une seule passe, par paquets
+        # Le CSV nettoyé est écrit au fil de l'eau, sans relecture
+        csv_file_path = cleaned_csv_path(file_path, compression)
+        with stage('ingestion') as info:
+            df_cleaned, stats = ingest_file(file_path, columns, dtype_dict, csv_path=csv_file_path, follow=follow)
+            info['rows'] = len(df_cleaned)
+        if not no_cache:
+            with stage('cache_ecriture', len(df_cleaned)):
+                store_cached(file_path, df_cleaned, stats, dtype_dict)
+    else:
+        print(f"Données chargées depuis le cache pour {file_path}")
+        write_missing_csv(df_cleaned, file_path, compression)
+
+    return df_cleaned, stats, schema
+
+
+# Charger seulement la plage [start, end) et les colonnes demandées (--from, --to, --columns) : lues directement
+# dans le cache si possible (voir query.py), sinon découpées après le chargement complet du fichier
+def load_range(file_path, start=None, end=None, columns=None, no_cache=False, compression=None):
+    if is_query(start, end, columns) and not no_cache:
+        schema = detect_schema(file_path)
+        with stage('requete') as info:
+            df, stats = query_cached(file_path, schema_dtypes(schema), start, end, columns)
+            info['rows'] = 0 if df is None else len(df)
+        if df is not None:
+            print(f"Plage lue depuis le cache pour {file_path} : {len(df)} lignes")
+            return df, stats, schema
+
+    df_cleaned, stats, schema = load_file(file_path, no_cache, compression=compression)
+    return select_range(df_cleaned, start, end, columns), stats, schema
 
-    fig.show()
 
+# CSV nettoyé écrit à côté du fichier TXT (data.csv, data.csv.gz ou data.csv.zst)
+def cleaned_csv_path(file_path, compression=None):
+    return output_path(f"{os.path.splitext(file_path)[0]}.csv", compression)
 
-# Ask if the user wants to plot the data
-plot_choice = input("Voulez-vous tracer les données ? (Y/N) : ").upper()
 
-if plot_choice == 'Y':
-    plot_data(df_cleaned)
-else:
-    print("Les données n'ont pas été tracées")
+# Données lues depuis le cache : écrire le CSV nettoyé s'il n'existe pas (supprimé, ou autre compression)
+def write_missing_csv(df_cleaned, file_path, compression=None):
+    csv_file_path = cleaned_csv_path(file_path, compression)
+    if os.path.exists(csv_file_path):
+        return
+    with stage('csv', len(df_cleaned)):
+        write_csv(df_cleaned, csv_file_path, sep=',')
+    print(f"Le CSV nettoyé a été écrit dans {csv_file_path}")
+
+
+# Lire les lignes ajoutées au fichier depuis stats['offset'] (stats est mis à jour), les ajouter au CSV nettoyé
+# et au cache ; retourne (df complété, nouvelles lignes)
+# Sans CSV nettoyé (supprimé, ou autre compression), il est écrit en entier au lieu de recevoir les seuls ajouts
+def read_new_lines(file_path, df, stats, schema, no_cache=False, follow=False, compression=None):
+    csv_file_path = cleaned_csv_path(file_path, compression)
+    append = os.path.exists(csv_file_path)
+    dtype_dict = schema_dtypes(schema)
+    new_rows, _ = ingest_file(file_path, schema_columns(schema), dtype_dict, csv_path=csv_file_path if append else None,
+                              stats=stats, follow=follow)
+    if len(new_rows):
+        if not no_cache:
+            append_cached(file_path, new_rows, stats, dtype_dict)
+        df = pd.concat([df, new_rows])
+    if not append:
+        write_missing_csv(df, file_path, compression)
+    return df, new_rows
+
+
+# Informations de traitement d'un fichier, au format de resultats.txt
+def results_summary(file_path, stats):
+    return (f"{file_path}\n"
+            f"Lignes totales : {stats['total_lines']}, Lignes incorrectes : {stats['incorrect_lines']}, "
+            f"Timestamps invalides : {stats['invalid_timestamp_count']}\n"
+            f"{qa_summary(stats.get('qa'))}")
+
+
+# Ajouter les informations de traitement à 'resultats.txt' (créé s'il n'existe pas) en une seule écriture
+def write_results(summaries):
+    with open(RESULTS_FILE, 'a') as f:
+        f.write(''.join(summaries))
+
+
+# Afficher le rapport d'ingestion et écrire le résumé qualité du fichier (<fichier>_qualite.csv, voir qa.py)
+def print_report(file_path, stats, row_count):
+    print(results_summary(file_path, stats), end='')
+
+    # Display the invalid timestamps and the number of total invalid timestamps
+    invalid_timestamps = stats['invalid_timestamps']
+    print(f"Total invalid timestamps: {len(invalid_timestamps)}")
+    if invalid_timestamps:
+        print("Invalid timestamps (line number, timestamp):")
+        for line_num, ts in invalid_timestamps:
+            print(f"Ligne {line_num}: {ts}")
+
+    print(f"Total lignes traitées: {stats['processed_lines']}")
+    print(f"Lignes valides: {row_count}")
+
+    print_qa(stats.get('qa', {}))
+    save_qa(file_path, stats.get('qa'))
+
+
+# partial : df_cleaned n'est qu'une partie du fichier (--from, --to, --columns) ; sa pyramide n'est pas enregistrée
+# suffix : ajouté au nom du fichier moyenné (plage de temps, voir query.range_suffix)
+def save_average(df_cleaned, file_path, interval, minmax=False, compression=None, partial=False, suffix=''):
+    # La pyramide est enregistrée à côté du fichier TXT et réutilisée tant qu'il ne change pas
+    with stage('pyramide'):
+        pyramid = build_pyramid(df_cleaned) if partial else load_or_build_pyramid(file_path, df_cleaned)
+    write_average(df_cleaned, file_path, interval, pyramid, minmax, compression, suffix)
+
+
+def averaged_csv_path(file_path, interval, compression=None, suffix=''):
+    return output_path(f"{os.path.splitext(file_path)[0]}_averaged_{interval}sec{suffix}.csv", compression)
+
+
+def write_average(df_cleaned, file_path, interval, pyramid, minmax=False, compression=None, suffix=''):
+    averaged_csv_file_path = averaged_csv_path(file_path, interval, compression, suffix)
+    with stage('moyenne') as info:
+        df_avg = average_data(df_cleaned, interval, pyramid, minmax)
+        info['rows'] = len(df_avg)
+    with stage('csv_moyenne', len(df_avg)):
+        write_csv(df_avg, averaged_csv_file_path, sep=',')
+    print(f"Les données ont été moyennées et enregistrées dans {averaged_csv_file_path}")
+
+
+# Mode suivi : relire le fichier toutes les `interval` secondes pendant que le logger l'écrit
+# Seules les lignes ajoutées sont lues, nettoyées, ajoutées au cache (et aux fenêtres de la moyenne si
+# interval_avg est donné) et envoyées au graphique ouvert dans le navigateur
+def follow_file(file_path, args, interval_avg=None):
+    df_cleaned, stats, schema = load_file(file_path, args.no_cache, follow=True, compression=args.compress)
+    print_report(file_path, stats, len(df_cleaned))
+    write_results([results_summary(file_path, stats)])
+
+    # La moyenne est calculée par flux (voir stream.py) : seules les fenêtres terminées sont écrites, puis
+    # chaque lecture ajoute au fichier moyenné les fenêtres que les nouvelles lignes ont terminées
+    state = {
+        'raw': df_cleaned,
+        'plot': prepare_plot_data(df_cleaned, schema, normalize=False),
+        'average': new_stream(interval_avg, args.minmax, plot=False) if interval_avg else None,
+    }
+    averaged_csv_file_path = averaged_csv_path(file_path, interval_avg, args.compress)
+    if interval_avg:
+        df_avg = stream_chunk(state['average'], df_cleaned)
+        if df_avg is not None:
+            write_csv(df_avg, averaged_csv_file_path, sep=',')
+        elif os.path.exists(averaged_csv_file_path):
+            # Aucune fenêtre terminée : l'ancien fichier moyenné ne doit pas recevoir les nouvelles lignes
+            os.remove(averaged_csv_file_path)
+        print(f"Les données ont été moyennées et enregistrées dans {averaged_csv_file_path}")
+
+    def update():
+        state['raw'], new_rows = read_new_lines(file_path, state['raw'], stats, schema, args.no_cache, follow=True,
+                                                compression=args.compress)
+        if not len(new_rows):
+            return None
+        print(f"{len(new_rows)} nouvelles lignes dans {file_path}")
+
+        # La dernière ligne déjà tracée est préparée avec les nouvelles pour détecter un écart à la jonction
+        junction = pd.concat([state['plot'].iloc[-1:], new_rows])
+        state['plot'] = pd.concat([state['plot'], prepare_plot_data(junction, schema, normalize=False).iloc[1:]])
+        if interval_avg:
+            late_rows = state['average']['late_rows']
+            append_average(stream_chunk(state['average'], new_rows), averaged_csv_file_path)
+            if state['average']['late_rows'] > late_rows:
+                print(f"{state['average']['late_rows'] - late_rows} lignes antérieures aux lignes déjà moyennées "
+                      f"n'ont pas été ajoutées au fichier moyenné")
+        return state['plot']
+
+    serve(state['plot'], SENSOR_GROUPS, file_path, args.port, args.max_points, args.downsample,
+          update=update, interval=args.interval)
+
+    # Dernière fenêtre, encore ouverte pendant le suivi
+    if interval_avg:
+        append_average(finish_stream(state['average']), averaged_csv_file_path)
+
+
+# Ajouter des lignes moyennées à la fin du fichier moyenné (sans réécrire les précédentes)
+def append_average(df_avg, path):
+    if df_avg is None or not len(df_avg):
+        return
+    with csv_writer(path, append=True, sep=',') as writer:
+        write_frame(writer, df_avg)
+
+
+# Mode --stream : lire le fichier par paquets sans jamais le charger entièrement (voir stream.py)
+# Le CSV nettoyé et le fichier moyenné sont écrits au fil des paquets ; le cache n'est pas utilisé
+# Retourne (stats, nombre de lignes, données des graphiques ou None, trace GPS ou None)
+def stream_file(file_path, interval=None, plot=False, show_map=False, minmax=False, compression=None,
+                map_tolerance=TOLERANCE_M):
+    schema = detect_schema(file_path)
+    columns, dtype_dict = schema_columns(schema), schema_dtypes(schema)
+    stats = new_stats()
+    state = new_stream(interval, minmax, MAX_GAP, map_tolerance if show_map else None, plot=plot)
+    averaged_csv_file_path = averaged_csv_path(file_path, interval, compression)
+
+    with csv_writer(cleaned_csv_path(file_path, compression), sep=',') as cleaned, \
+            (csv_writer(averaged_csv_file_path, sep=',') if interval else nullcontext()) as averaged:
+        with stage('ingestion') as info:
+            for chunk in iter_chunks(file_path, columns, dtype_dict, stats):
+                with stage('csv', len(chunk)):
+                    write_frame(cleaned, chunk)
+                with stage('flux', len(chunk)):
+                    df_avg = stream_chunk(state, chunk)
+                if df_avg is not None:
+                    write_frame(averaged, df_avg)
+            df_avg = finish_stream(state)
+            if df_avg is not None:
+                write_frame(averaged, df_avg)
+            info['rows'] = state['rows']
+
+    if interval:
+        print(f"Les données ont été moyennées et enregistrées dans {averaged_csv_file_path}")
+    if state['late_rows']:
+        print(f"{state['late_rows']} lignes antérieures aux lignes précédentes n'ont pas été agrégées "
+              f"(elles restent dans le CSV nettoyé)")
+    print(f"{len(stream_gaps(state))} écarts de plus de {MAX_GAP} détectés")
+
+    df_plot = None
+    if plot:
+        with stage('preparation'):
+            df_plot, level = stream_plot_frame(state, numeric_columns(schema))
+        if df_plot is not None:
+            print(f"Graphiques tracés depuis les moyennes par {level}s")
+            # Normalisation avec le min/max de toutes les lignes, calculé pendant la lecture
+            for col in ['PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)']:
+                df_plot[f'{col}_normalized'] = normalize_series(df_plot[col], state['min'][col], state['max'][col])
+    track = stream_track(state) if show_map else None
+    if track is not None:
+        print_track_reduction(state['track_points'], len(track))
+    return stats, state['rows'], df_plot, track
+
+
+# Traitement non interactif d'un fichier (mode batch) ; retourne les lignes pour resultats.txt
+# stream : lire le fichier par paquets, en mémoire bornée (voir stream_file)
+def process_file(file_path, interval=None, plot=False, show_map=False, no_cache=False,
+                 max_points=MAX_POINTS, method='m4', minmax=False, webgl_threshold=WEBGL_THRESHOLD,
+                 density_threshold=MAP_DENSITY_THRESHOLD, combined=False, report=False,
+                 map_tolerance=TOLERANCE_M, map_hex=None, compression=None, stream=False, start=None, end=None,
+                 columns=None):
+    if stream:
+        return process_stream(file_path, interval, plot, show_map, max_points, method, minmax, webgl_threshold,
+                              density_threshold, combined, report, map_tolerance, map_hex, compression)
+
+    df_cleaned, stats, schema = load_range(file_path, start, end, columns, no_cache, compression)
+    print_report(file_path, stats, len(df_cleaned))
+
+    if interval:
+        save_average(df_cleaned, file_path, interval, minmax, compression, is_query(start, end, columns),
+                     range_suffix(start, end))
+    figures = []
+    if plot:
+        figures += plot_data(df_cleaned, file_path, schema, max_points, method, webgl_threshold, combined)
+    if show_map:
+        figures += [fig for fig in [plot_map(df_cleaned, density_threshold, map_tolerance, map_hex)] if fig is not None]
+    show_figures(figures, file_path, report)
+
+    return results_summary(file_path, stats)
+
+
+def process_stream(file_path, interval=None, plot=False, show_map=False, max_points=MAX_POINTS, method='m4',
+                   minmax=False, webgl_threshold=WEBGL_THRESHOLD, density_threshold=MAP_DENSITY_THRESHOLD,
+                   combined=False, report=False, map_tolerance=TOLERANCE_M, map_hex=None, compression=None):
+    stats, row_count, df_plot, track = stream_file(file_path, interval, plot, show_map, minmax, compression,
+                                                   map_tolerance)
+    print_report(file_path, stats, row_count)
+
+    figures = []
+    if df_plot is not None:
+        figures += plot_figures(df_plot, file_path, max_points, method, webgl_threshold, combined)
+    if show_map:
+        if map_hex:
+            print("--map-hex n'est pas disponible avec --stream : la trace simplifiée est affichée")
+        if track is None:
+            print("Aucune donnée valide pour afficher sur la carte.")
+        else:
+            # Trace déjà simplifiée pendant la lecture (réduction affichée par stream_file)
+            figures += [fig for fig in [plot_map(track, density_threshold, map_tolerance, simplify=False)]
+                        if fig is not None]
+    show_figures(figures, file_path, report)
+
+    return results_summary(file_path, stats)
+
+
+# Traiter tous les fichiers en parallèle ; resultats.txt est écrit une seule fois, dans l'ordre des fichiers
+def run_batch(txt_files, args):
+    interval = None if args.no_average else args.average
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(process_file, file_path, interval, bool(args.plot), bool(args.map), args.no_cache,
+                               args.max_points, args.downsample, args.minmax, args.webgl_threshold,
+                               args.map_density_threshold, args.combined, args.report, args.map_tolerance,
+                               args.map_hex, args.compress, args.stream, args.start, args.end, args.columns)
+                   for file_path in txt_files]
+        summaries = [future.result() for future in futures]
+    write_results(summaries)
+    print(f"{len(txt_files)} fichiers traités, résumé ajouté à {RESULTS_FILE}")
+
+
+# Charger tous les fichiers en parallèle et les tracer ensemble, une trace par logger
+def run_merge(txt_files, args):
+    load = partial(load_range, start=args.start, end=args.end, columns=args.columns, no_cache=args.no_cache,
+                   compression=args.compress)
+    df, results = load_timeline(txt_files, load, args.workers)
+    for file_path, (stats, _, row_count) in zip(txt_files, results):
+        print_report(file_path, stats, row_count)
+    write_results([results_summary(file_path, stats) for file_path, (stats, _, _) in zip(txt_files, results)])
+    print(f"{len(txt_files)} fichiers fusionnés : {len(df)} lignes, {df[DEVICE_COLUMN].nunique()} loggers")
+
+    figures = []
+    if args.plot:
+        figures += plot_data(df, MERGED_NAME, results[0][1], args.max_points, args.downsample, args.webgl_threshold,
+                             args.combined, DEVICE_COLUMN)
+    if args.map:
+        figures += [fig for fig in [plot_map(df, args.map_density_threshold, args.map_tolerance, args.map_hex)]
+                    if fig is not None]
+    show_figures(figures, MERGED_NAME, args.report)
+
+
+# Intervalle de moyenne en secondes (option --average, ou question), None pour ne pas moyenner
+def ask_interval(args):
+    # Demander à l'utilisateur s'il veut moyenner les données
+    if args.average:
+        return args.average
+    if not args.no_average and ask_yes_no("Voulez-vous moyenner les données ?"):
+        # Demander à l'utilisateur l'intervalle de temps pour moyenner les données en secondes
+        return int(input("Entrez l'intervalle de temps pour moyenner les données en secondes : "))
+    return None
+
+
+def run_interactive(txt_files, args):
+    if args.file:
+        file_path = args.file
+    else:
+        if args.choice is None:
+            # Afficher les fichiers disponibles et demander à l'utilisateur d'en choisir un
+            print("Fichiers TXT disponibles :")
+            for i, file in enumerate(txt_files, 1):
+                print(f"{i}. {file}")
+            choice = int(input("Sélectionnez un fichier par son numéro : ")) - 1
+        else:
+            choice = args.choice - 1
+        file_path = txt_files[choice]
+
+    if args.follow:
+        follow_file(file_path, args, None if args.no_average else args.average)
+        return
+
+    if args.stream:
+        # Le fichier n'est lu qu'une fois : tous les choix sont demandés avant la lecture
+        interval = ask_interval(args)
+        plot_choice = args.plot if args.plot is not None else ask_yes_no("Voulez-vous tracer les données ?")
+        map_choice = (args.map if args.map is not None
+                      else ask_yes_no("Voulez-vous afficher les données sur une carte ?"))
+        write_results([process_stream(file_path, interval, plot_choice, map_choice, args.max_points, args.downsample,
+                                      args.minmax, args.webgl_threshold, args.map_density_threshold, args.combined,
+                                      args.report, args.map_tolerance, args.map_hex, args.compress)])
+        return
+
+    df_cleaned, stats, schema = load_range(file_path, args.start, args.end, args.columns, args.no_cache,
+                                           args.compress)
+    print_report(file_path, stats, len(df_cleaned))
+    write_results([results_summary(file_path, stats)])
+
+    interval = ask_interval(args)
+    if interval:
+        save_average(df_cleaned, file_path, interval, args.minmax, args.compress,
+                     is_query(args.start, args.end, args.columns), range_suffix(args.start, args.end))
+    else:
+        print("Les données n'ont pas été moyennées")
+
+    # Ask if the user wants to plot the data
+    figures = []
+    plot_choice = args.plot if args.plot is not None else ask_yes_no("Voulez-vous tracer les données ?")
+    if plot_choice and args.serve:
+        # Seuls les groupes dont une colonne au moins est chargée (--columns)
+        df_plot = prepare_plot_data(df_cleaned, schema)
+        serve(df_plot, available_groups(df_plot, SENSOR_GROUPS), file_path, args.port, args.max_points,
+              args.downsample)
+    elif plot_choice:
+        figures += plot_data(df_cleaned, file_path, schema, args.max_points, args.downsample,
+                             args.webgl_threshold, args.combined)
+    else:
+        print("Les données n'ont pas été tracées")
+
+    # Ask if the user wants to display the data on a map
+    map_choice = args.map if args.map is not None else ask_yes_no("Voulez-vous afficher les données sur une carte ?")
+    if map_choice:
+        figures += [fig for fig in [plot_map(df_cleaned, args.map_density_threshold, args.map_tolerance, args.map_hex)]
+                    if fig is not None]
+    else:
+        print("Les données n'ont pas été affichées sur la carte.")
+
+    show_figures(figures, file_path, args.report)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    txt_files = list_txt_files()
+
+    # Si aucun fichier TXT n'est trouvé, afficher un message d'erreur
+    if not txt_files and not args.file:
+        print("Aucun fichier TXT trouvé dans le répertoire actuel.")
+        return
+
+    if args.profile:
+        enable_profiling(args.profile_memory, args.cprofile)
+    try:
+        if args.merge:
+            run_merge(txt_files, args)
+        elif args.batch:
+            run_batch(txt_files, args)
+        else:
+            run_interactive(txt_files, args)
+    finally:
+        save_profile(os.path.join(os.path.dirname(RESULTS_FILE), PROFILE_FILE))
 
-# Ask if the user wants to display the data on a map
-map_choice = input("Voulez-vous afficher les données sur une carte ? (Y/N) : ").upper()
 
-if map_choice == 'Y':
-    plot_map(df_cleaned)
-else:
-    print("Les données n'ont pas été affichées sur la carte.")
+if __name__ == '__main__':
+    main()
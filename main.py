@@ -1,62 +1,104 @@
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-from scipy.stats import linregress
 
+from cache import store_cached
+from calibration import METHODS as CALIBRATION_METHODS, apply_calibration, calibration_table, save_table
+from cleaning import TIMESTAMP_FORMAT
+from downsample import MAX_POINTS, METHODS
+from figures import WEBGL_THRESHOLD, build_figures, build_subplots, scatter_trace
+from ingest import detect_schema, read_csv_file
+from output import COMPRESSIONS, output_path, write_csv
+from pyramid import aggregate, build_pyramid, load_or_build_pyramid
+from qa import print_qa, qa_counts, save_qa
+from query import is_query, parse_columns, parse_time, query_cached, select_range
+from schema import schema_dtypes
+
+# Groupes de capteurs de data.csv (même format que figures.SENSOR_GROUPS) : un graphique par groupe
+SENSOR_GROUPS = [
+    {'name': 'PM', 'title': 'Particules PM', 'yaxis_title': 'Concentration (ug/m3)',
+     'columns': ['PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)']},
+    {'name': 'T', 'title': 'Températures', 'yaxis_title': 'Température (°C)',
+     'columns': ['T_DPS310(C)', 'T_AM2320(C)']},
+    {'name': 'H', 'title': 'Humidité', 'yaxis_title': 'Humidité (%)',
+     'columns': ['H_HDC1080(%)', 'H_AM2320(%)']},
+]
+
+AVERAGED_FILE = 'data_averaged.csv'
+
+# Paires de capteurs calibrées : le capteur est ajusté sur la référence (capteur = pente * référence + ordonnée)
+CALIBRATION_PAIRS = [
+    {'name': 'Températures', 'reference': 'T_DPS310(C)', 'sensor': 'T_AM2320(C)'},
+    {'name': 'Humidité', 'reference': 'H_HDC1080(%)', 'sensor': 'H_AM2320(%)'},
+]
 
 # Pour lancer le programme, exécutez la commande suivante dans le terminal:
 # python main.py
+# Les choix peuvent aussi être passés en options (voir python main.py --help), par exemple:
+# python main.py --file data.csv --average 60 --mode A
 # Assurez-vous d'avoir installé les bibliothèques nécessaires en exécutant:
-# pip install pandas plotly scipy
+# pip install pandas plotly
 # Assurez-vous d'avoir le fichier data.csv dans le même répertoire que ce script
 # Fonction pour moyennage des données
-def average_data(df, window_size):
-    df = df.copy()
-    df.set_index('horodatage', inplace=True)
-    df.index = pd.to_datetime(df.index, format='%Y_%m_%d_%H_%M_%S')
-
-    # Sélectionner uniquement les colonnes numériques pour le moyennage
-    numeric_cols = df.select_dtypes(include=['number']).columns
-
-    df_resampled = df[numeric_cols].resample(f'{window_size}s').mean()
-    df_resampled.index = df_resampled.index.strftime('%Y_%m_%d_%H_%M_%S')
-    df_resampled.reset_index(inplace=True)
-    return df_resampled
-
-
-# Lire les données à partir du fichier CSV
-file_path = 'data.csv'
-df = pd.read_csv(file_path, delimiter=';')
-
-# Convertir la colonne horodatage en datetime et extraire la date
-df['horodatage'] = pd.to_datetime(df['horodatage'], format='%Y_%m_%d_%H_%M_%S')
-df['date'] = df['horodatage'].dt.strftime('%Y-%m-%d')
-
-# Demander si l'utilisateur veut moyenner les résultats
-average_choice = input("Voulez-vous moyenner les résultats ? (O/N) : ").strip().upper()
+# Les moyennes sont lues dans la pyramide d'agrégats (voir pyramid.py) plutôt que recalculées sur les données brutes
+# df et le résultat sont indexés par 'horodatage' (DatetimeIndex)
+def average_data(df, window_size, pyramid=None):
+    if pyramid is None:
+        pyramid = build_pyramid(df)
+    return aggregate(pyramid, window_size)
+
+
+# Lire les données à partir du fichier CSV, au format reconnu depuis son en-tête (voir schema.py)
+# horodatage est converti en datetime une seule fois et sert d'index pour toute la suite
+# Le fichier lu est mis en cache : les lancements suivants, et la plage [start, end) des options --from/--to,
+# sont lus directement dans le cache (voir query.py)
+def load_data(file_path, start=None, end=None, columns=None, no_cache=False):
+    schema = detect_schema(file_path)
+    dtype_dict = schema_dtypes(schema)
+    if not no_cache:
+        df, _ = query_cached(file_path, dtype_dict, start, end, columns)
+        if df is not None:
+            print(f"Données lues depuis le cache pour {file_path} : {len(df)} lignes")
+            return df
+
+    df = read_csv_file(file_path, schema)
+    if not no_cache:
+        store_cached(file_path, df, {}, dtype_dict)
+    return select_range(df, start, end, columns)
+
+
+# Écrire les données moyennées en arrière-plan pendant que les graphiques sont préparés
+# Mise en forme dans ce thread (workers=1) : aucun groupe de processus n'est lancé depuis ce thread pendant que
+# le programme principal lance ceux des graphiques jour par jour
+def save_average_async(df, path):
+    def write():
+        write_csv(df, path, workers=1, sep=';', date_format=TIMESTAMP_FORMAT)
+        print(f"Données moyennées enregistrées dans {path}")
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+# fit : ligne de la table de calibration (voir calibration.py) pour cette paire de capteurs et cette période
+def plot_calibration(daily_data, fit, title, webgl_threshold=WEBGL_THRESHOLD):
+    import plotly.graph_objects as go
 
-if average_choice == 'O':
-    window_size = int(input("Par paquet de combien de secondes voulez-vous moyenner les données ? : "))
-    df = average_data(df, window_size)
-    avg_file_path = 'data_averaged.csv'
-    df.to_csv(avg_file_path, index=False, sep=';')
-    print(f"Données moyennées enregistrées dans {avg_file_path}")
-
-# Demander à l'utilisateur ce qu'il veut faire
-choice = input(
-    "Appuyez sur 'D' pour des graphiques jour par jour, 'A' pour un graphique global ou 'C' pour calibration: ").strip().upper()
-
-
-def plot_calibration(daily_data, x_col, y_col, title):
     # Régression linéaire
-    slope, intercept, r_value, p_value, std_err = linregress(daily_data[x_col], daily_data[y_col])
-    r_squared = r_value ** 2
+    x_col, y_col = fit['reference'], fit['sensor']
+    slope, intercept, r_squared = fit['slope'], fit['intercept'], fit['r2']
 
     # Tracer les données et la ligne de régression
     fig = go.Figure()
 
-    fig.add_trace(go.Scatter(x=daily_data[x_col], y=daily_data[y_col], mode='markers', name='Données'))
-    fig.add_trace(go.Scatter(x=daily_data[x_col], y=slope * daily_data[x_col] + intercept, mode='lines',
-                             name='Régression linéaire'))
+    # Rendu WebGL au-delà de webgl_threshold points
+    fig.add_trace(scatter_trace(daily_data[x_col], daily_data[y_col], webgl_threshold, mode='markers', name='Données'))
+    fig.add_trace(scatter_trace(daily_data[x_col], slope * daily_data[x_col] + intercept, webgl_threshold, mode='lines',
+                                name='Régression linéaire'))
 
     # Annotation pour l'équation et R^2
     annotation_text = f"Équation: y = {slope:.2f}x + {intercept:.2f}<br>R² = {r_squared:.2f}"
@@ -80,110 +122,203 @@ def plot_calibration(daily_data, x_col, y_col, title):
         hovermode='closest'
     )
 
-    fig.show()
-
-
-# Si des données moyennées ont été générées, les utiliser
-if average_choice == 'O':
-    df = pd.read_csv(avg_file_path, delimiter=';')
-    # Convertir à nouveau la colonne horodatage en datetime
-    df['horodatage'] = pd.to_datetime(df['horodatage'], format='%Y_%m_%d_%H_%M_%S')
-    df['date'] = df['horodatage'].dt.strftime('%Y-%m-%d')
-
-if choice == 'D':
-    # Créer des graphiques pour chaque jour
-    unique_dates = df['date'].unique()
-
-    for date in unique_dates:
-        daily_data = df[df['date'] == date]
-
-        # Graphique des PM
-        fig_pm = go.Figure()
-        fig_pm.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['PM1.0(ug/m3)'], mode='lines', name='PM1.0(ug/m3)'))
-        fig_pm.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['PM2.5(ug/m3)'], mode='lines', name='PM2.5(ug/m3)'))
-        fig_pm.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['PM10(ug/m3)'], mode='lines', name='PM10(ug/m3)'))
-        fig_pm.update_layout(title=f'Particules PM - {date}', xaxis_title='Temps', yaxis_title='Concentration (ug/m3)',
-                             hovermode='x unified')
-
-        # Graphique des températures
-        fig_temp = go.Figure()
-        fig_temp.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['T_DPS310(C)'], mode='lines', name='T_DPS310(C)'))
-        fig_temp.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['T_AM2320(C)'], mode='lines', name='T_AM2320(C)'))
-        fig_temp.update_layout(title=f'Températures - {date}', xaxis_title='Temps', yaxis_title='Température (°C)',
-                               hovermode='x unified')
-
-        # Graphique de l'humidité
-        fig_hum = go.Figure()
-        fig_hum.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['H_HDC1080(%)'], mode='lines', name='H_HDC1080(%)'))
-        fig_hum.add_trace(
-            go.Scatter(x=daily_data['horodatage'], y=daily_data['H_AM2320(%)'], mode='lines', name='H_AM2320(%)'))
-        fig_hum.update_layout(title=f'Humidité - {date}', xaxis_title='Temps', yaxis_title='Humidité (%)',
-                              hovermode='x unified')
-
-        # Afficher les graphiques
-        fig_pm.show()
-        fig_temp.show()
-        fig_hum.show()
-
-elif choice == 'A':
-    # Graphique global des PM
-    fig_pm = go.Figure()
-    fig_pm.add_trace(go.Scatter(x=df['horodatage'], y=df['PM1.0(ug/m3)'], mode='lines', name='PM1.0(ug/m3)'))
-    fig_pm.add_trace(go.Scatter(x=df['horodatage'], y=df['PM2.5(ug/m3)'], mode='lines', name='PM2.5(ug/m3)'))
-    fig_pm.add_trace(go.Scatter(x=df['horodatage'], y=df['PM10(ug/m3)'], mode='lines', name='PM10(ug/m3)'))
-    fig_pm.update_layout(title='Particules PM - Global', xaxis_title='Temps', yaxis_title='Concentration (ug/m3)',
-                         hovermode='x unified')
-
-    # Graphique global des températures
-    fig_temp = go.Figure()
-    fig_temp.add_trace(go.Scatter(x=df['horodatage'], y=df['T_DPS310(C)'], mode='lines', name='T_DPS310(C)'))
-    fig_temp.add_trace(go.Scatter(x=df['horodatage'], y=df['T_AM2320(C)'], mode='lines', name='T_AM2320(C)'))
-    fig_temp.update_layout(title='Températures - Global', xaxis_title='Temps', yaxis_title='Température (°C)',
-                           hovermode='x unified')
-
-    # Graphique global de l'humidité
-    fig_hum = go.Figure()
-    fig_hum.add_trace(go.Scatter(x=df['horodatage'], y=df['H_HDC1080(%)'], mode='lines', name='H_HDC1080(%)'))
-    fig_hum.add_trace(go.Scatter(x=df['horodatage'], y=df['H_AM2320(%)'], mode='lines', name='H_AM2320(%)'))
-    fig_hum.update_layout(title='Humidité - Global', xaxis_title='Temps', yaxis_title='Humidité (%)',
-                          hovermode='x unified')
-
-    # Afficher les graphiques
-    fig_pm.show()
-    fig_temp.show()
-    fig_hum.show()
-
-elif choice == 'C':
-    # Demander pour la calibration
-    calib_choice = input(
-        "Appuyez sur 'D' pour la calibration jour par jour ou 'A' pour la calibration globale : ").strip().upper()
-
-    if calib_choice == 'D':
-        unique_dates = df['date'].unique()
-        for date in unique_dates:
-            daily_data = df[df['date'] == date]
-
-            # Calibration des températures
-            plot_calibration(daily_data, 'T_DPS310(C)', 'T_AM2320(C)', f'Calibration Températures - {date}')
-
-            # Calibration de l'humidité
-            plot_calibration(daily_data, 'H_HDC1080(%)', 'H_AM2320(%)', f'Calibration Humidité - {date}')
-
-    elif calib_choice == 'A':
-        # Calibration globale des températures
-        plot_calibration(df, 'T_DPS310(C)', 'T_AM2320(C)', 'Calibration Températures - Global')
-
-        # Calibration globale de l'humidité
-        plot_calibration(df, 'H_HDC1080(%)', 'H_AM2320(%)', 'Calibration Humidité - Global')
+    return fig
+
+
+# Découper df en tranches d'un jour en une seule passe sur l'index ramené à minuit
+# Les données étant triées, chaque jour est un bloc de lignes contiguës : df.iloc[début:fin] sans filtre ni copie
+def split_days(df):
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    keys = df.index.normalize().asi8
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(keys)]
+    return [(f"{pd.Timestamp(keys[start]):%Y-%m-%d}", df.iloc[start:end]) for start, end in zip(starts, ends)]
+
+
+# Appliquer func(date, daily_data) à chaque jour, en parallèle sur plusieurs processus
+def map_days(func, days, workers=None):
+    if workers == 1 or len(days) <= 1:
+        return [func(date, daily_data) for date, daily_data in days]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*days)))
+
+
+# Graphiques (PM, températures, humidité) d'une journée, sans réduction des points
+def daily_figures(date, daily_data, webgl_threshold=WEBGL_THRESHOLD, combined=False):
+    if combined:
+        figures = [build_subplots(daily_data, SENSOR_GROUPS, f'Données - {date}', None, None,
+                                  webgl_threshold=webgl_threshold)]
+    else:
+        figures = build_figures(daily_data, SENSOR_GROUPS, date, None, None, webgl_threshold=webgl_threshold,
+                                rangeselector=False)
+    return date, figures
+
+
+# Créer des graphiques pour chaque jour
+# Retourne une section (titre, figures) par jour
+def plot_daily(df, webgl_threshold=WEBGL_THRESHOLD, combined=False, workers=None):
+    return map_days(partial(daily_figures, webgl_threshold=webgl_threshold, combined=combined), split_days(df),
+                    workers)
+
+
+def plot_global(df, max_points=MAX_POINTS, method='m4', webgl_threshold=WEBGL_THRESHOLD, combined=False):
+    # Chaque trace est réduite à max_points points (min/max conservés avec M4)
+    # et passe en rendu WebGL au-delà de webgl_threshold points
+    if combined:
+        figures = [build_subplots(df, SENSOR_GROUPS, 'Données - Global', None, max_points, method, webgl_threshold)]
+    else:
+        figures = build_figures(df, SENSOR_GROUPS, 'Global', None, max_points, method, webgl_threshold,
+                                rangeselector=False)
+    return [('Global', figures)]
+
+
+# Un graphique par paire de capteurs (températures, humidité), avec l'ajustement de la table pour ce jour
+def daily_calibration(date, daily_data, table, webgl_threshold=WEBGL_THRESHOLD):
+    fits = table[table['period'] == pd.Timestamp(date)]
+    return date, [plot_calibration(daily_data, fit, f"Calibration {fit['name']} - {date}", webgl_threshold)
+                  for _, fit in fits.iterrows()]
+
+
+def plot_daily_calibration(df, table, webgl_threshold=WEBGL_THRESHOLD, workers=None):
+    return map_days(partial(daily_calibration, table=table, webgl_threshold=webgl_threshold), split_days(df),
+                    workers)
+
+
+def plot_global_calibration(df, table, webgl_threshold=WEBGL_THRESHOLD):
+    return [('Global', [plot_calibration(df, fit, f"Calibration {fit['name']} - Global", webgl_threshold)
+                        for _, fit in table.iterrows()])]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Graphiques et calibration des données du logger. "
+                                                 "Les choix non fournis en option sont demandés interactivement.")
+    parser.add_argument('--file', default='data.csv', help="Fichier CSV à lire (séparateur ';')")
+    parser.add_argument('--average', type=int, metavar='SECONDES', help="Moyenner les résultats sur cet intervalle")
+    parser.add_argument('--no-average', action='store_true', help="Ne pas moyenner les résultats")
+    parser.add_argument('--save-average', action=argparse.BooleanOptionalAction, default=True,
+                        help=f"Enregistrer les données moyennées dans {AVERAGED_FILE} (en arrière-plan)")
+    parser.add_argument('--mode', type=str.upper, choices=['D', 'A', 'C'],
+                        help="'D' jour par jour, 'A' graphique global, 'C' calibration")
+    parser.add_argument('--calibration', type=str.upper, choices=['D', 'A'],
+                        help="Calibration 'D' jour par jour ou 'A' globale")
+    parser.add_argument('--calibration-method', choices=CALIBRATION_METHODS, default='ols',
+                        help="Ajustement des moindres carrés ('ols') ou robuste aux valeurs aberrantes "
+                             "('huber', 'theilsen')")
+    parser.add_argument('--calibration-window', type=int, default=1, metavar='JOURS',
+                        help="Calibration jour par jour : nombre de jours de chaque ajustement (fenêtre glissante)")
+    parser.add_argument('--calibration-table', metavar='FICHIER',
+                        help="Enregistrer la table de calibration (.csv, ou .parquet avec pyarrow)")
+    parser.add_argument('--compress', choices=COMPRESSIONS,
+                        help=f"Compresser {AVERAGED_FILE} (.gz, ou .zst avec le module zstandard)")
+    parser.add_argument('--corrected', metavar='FICHIER',
+                        help="Enregistrer les données avec les colonnes corrigées '<capteur>_calibrated'")
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS,
+                        help="Nombre maximal de points par trace du graphique global (0 pour tout tracer)")
+    parser.add_argument('--downsample', choices=METHODS, default='m4', help="Méthode de réduction des traces")
+    parser.add_argument('--webgl-threshold', type=int, default=WEBGL_THRESHOLD,
+                        help="Nombre de points au-delà duquel une trace est rendue en WebGL (0 pour jamais)")
+    parser.add_argument('--combined', action='store_true',
+                        help="Un seul graphique avec un sous-graphique par capteur et l'axe des temps partagé")
+    parser.add_argument('--workers', type=int,
+                        help="Nombre de processus pour les graphiques jour par jour (par défaut : nombre de coeurs)")
+    parser.add_argument('--from', dest='start', type=parse_time, metavar='DATE',
+                        help="Ne lire que les données à partir de cette date (2024-03-07T06:00 ou 2024_03_07_06_00_00)")
+    parser.add_argument('--to', dest='end', type=parse_time, metavar='DATE',
+                        help="Ne lire que les données avant cette date (exclue)")
+    parser.add_argument('--columns', type=parse_columns, metavar='COL1,COL2',
+                        help="Ne lire que ces colonnes (séparées par des virgules)")
+    parser.add_argument('--no-cache', action='store_true', help="Ignorer le cache et relire le fichier CSV")
+    parser.add_argument('--report', nargs='?', const='rapport.html', metavar='FICHIER',
+                        help="Écrire tous les graphiques dans un seul rapport HTML (par défaut rapport.html) "
+                             "au lieu d'ouvrir un onglet par graphique")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # plotly n'est importé qu'après la lecture des options (--help immédiat)
+    from report import output_sections
+
+    df = load_data(args.file, args.start, args.end, args.columns, args.no_cache)
+
+    # Contrôle qualité de tout le fichier (voir qa.py), écrit dans data_qualite.csv
+    if not is_query(args.start, args.end, args.columns):
+        counts = qa_counts(df)
+        print_qa(counts)
+        save_qa(args.file, counts)
+
+    # Demander si l'utilisateur veut moyenner les résultats
+    if args.average:
+        window_size = args.average
+    elif args.no_average:
+        window_size = None
+    elif input("Voulez-vous moyenner les résultats ? (O/N) : ").strip().upper() == 'O':
+        window_size = int(input("Par paquet de combien de secondes voulez-vous moyenner les données ? : "))
+    else:
+        window_size = None
+
+    writer = None
+    if window_size:
+        # Pyramide enregistrée à côté du fichier de données et réutilisée tant qu'il ne change pas
+        # (sauf pour une partie du fichier seulement : --from, --to, --columns)
+        if is_query(args.start, args.end, args.columns):
+            pyramid = build_pyramid(df)
+        else:
+            pyramid = load_or_build_pyramid(args.file, df)
+        df = average_data(df, window_size, pyramid)
+
+        # Les données moyennées restent en mémoire ; le CSV est écrit en parallèle des graphiques
+        if args.save_average:
+            writer = save_average_async(df, output_path(AVERAGED_FILE, args.compress))
+
+    # Demander à l'utilisateur ce qu'il veut faire
+    choice = args.mode or input(
+        "Appuyez sur 'D' pour des graphiques jour par jour, 'A' pour un graphique global ou 'C' pour calibration: ").strip().upper()
+
+    if choice == 'D':
+        output_sections(plot_daily(df, args.webgl_threshold, args.combined, args.workers),
+                        'Graphiques jour par jour', args.report)
+
+    elif choice == 'A':
+        output_sections(plot_global(df, args.max_points, args.downsample, args.webgl_threshold, args.combined),
+                        'Graphique global', args.report)
+
+    elif choice == 'C':
+        # Demander pour la calibration
+        calib_choice = args.calibration or input(
+            "Appuyez sur 'D' pour la calibration jour par jour ou 'A' pour la calibration globale : ").strip().upper()
+
+        if calib_choice in ('D', 'A'):
+            # Tous les ajustements (chaque paire de capteurs, chaque jour) sont calculés en une seule passe
+            # Avec --columns, seules les paires dont les deux capteurs sont chargés
+            pairs = [pair for pair in CALIBRATION_PAIRS
+                     if pair['reference'] in df.columns and pair['sensor'] in df.columns]
+            table = calibration_table(df, pairs, '1D' if calib_choice == 'D' else None,
+                                      args.calibration_window if calib_choice == 'D' else 1, args.calibration_method)
+            if args.calibration_table:
+                save_table(table, args.calibration_table)
+            if args.corrected:
+                write_csv(apply_calibration(df, table), args.corrected, sep=';', date_format=TIMESTAMP_FORMAT)
+                print(f"Données corrigées enregistrées dans {args.corrected}")
+
+        if calib_choice == 'D':
+            output_sections(plot_daily_calibration(df, table, args.webgl_threshold, args.workers),
+                            'Calibration jour par jour', args.report)
+
+        elif calib_choice == 'A':
+            output_sections(plot_global_calibration(df, table, args.webgl_threshold), 'Calibration globale',
+                            args.report)
+
+        else:
+            print("Choix invalide. Veuillez appuyer sur 'D' ou 'A'.")
 
     else:
-        print("Choix invalide. Veuillez appuyer sur 'D' ou 'A'.")
+        print("Choix invalide. Veuillez appuyer sur 'D', 'A', ou 'C'.")
+
+    if writer is not None:
+        writer.join()
+
 
-else:
-    print("Choix invalide. Veuillez appuyer sur 'D', 'A', ou 'C'.")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import gzip
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Écriture des CSV de sortie (nettoyé, moyenné) :
+# - en une seule fois, par paquets : chaque DataFrame reçu est découpé en tranches de FORMAT_ROWS lignes,
+#   mises en forme en parallèle dans des processus pendant que le programme continue (lecture, nettoyage...) ;
+# - compressé si demandé (gzip, ou zstd avec le module zstandard) ;
+# - dans un fichier temporaire renommé à la fin : un arrêt brutal ne laisse jamais un CSV à moitié écrit
+#   à la place du fichier attendu (sauf en mode ajout, utilisé par le mode suivi).
+
+COMPRESSIONS = ('gzip', 'zstd')
+SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+# Niveaux de compression : rapides, la compression ne doit pas redevenir le facteur limitant
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# Lignes par tranche mise en forme, et nombre maximal de tranches en attente par processus (borne la mémoire)
+FORMAT_ROWS = 50_000
+PENDING_PER_WORKER = 2
+
+# Processus de mise en forme par défaut
+MAX_WORKERS = 4
+
+
+# Chemin du fichier de sortie avec l'extension de la compression (ex. data.csv.gz)
+def output_path(path, compression=None):
+    return path + SUFFIXES[compression]
+
+
+# Compression déduite de l'extension du fichier, comme pandas (compression='infer')
+def infer_compression(path):
+    for compression, suffix in SUFFIXES.items():
+        if compression and path.endswith(suffix):
+            return compression
+    return None
+
+
+# Dans un processus du mode batch ou fusion (--workers), les tranches sont mises en forme sur place :
+# chaque processus lancerait sinon son propre groupe de processus de mise en forme
+def default_workers():
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return max(1, min(MAX_WORKERS, (os.cpu_count() or 1) - 1))
+
+
+# Mettre en forme une tranche en CSV (exécuté dans un processus de mise en forme)
+def format_rows(df, header, to_csv_kwargs):
+    return df.to_csv(header=header, **to_csv_kwargs).encode()
+
+
+def open_stream(raw, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("La compression zstd nécessite le module zstandard (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=False)
+    return raw
+
+
+# Ouvrir un CSV de sortie ; append : ajouter au fichier existant (sans fichier temporaire ni nouvel en-tête)
+# compression : 'infer' (d'après l'extension), None, 'gzip' ou 'zstd'
+# Les autres arguments (sep, date_format...) sont ceux de DataFrame.to_csv
+def open_writer(path, compression='infer', workers=None, append=False, **to_csv_kwargs):
+    if compression == 'infer':
+        compression = infer_compression(path)
+    if compression not in SUFFIXES:
+        raise ValueError(f"Compression inconnue : {compression} (choix : {', '.join(COMPRESSIONS)})")
+    workers = default_workers() if workers is None else workers
+    append = append and os.path.exists(path) and os.path.getsize(path) > 0
+    target = path if append else f"{path}.{os.getpid()}.tmp"
+    raw = open(target, 'ab' if append else 'wb')
+    return {
+        'path': path,
+        'target': target,
+        'append': append,
+        'raw': raw,
+        'stream': open_stream(raw, compression),
+        'header': not append,
+        'to_csv_kwargs': to_csv_kwargs,
+        'pool': ProcessPoolExecutor(max_workers=workers) if workers > 1 else None,
+        'max_pending': workers * PENDING_PER_WORKER,
+        'pending': deque(),
+    }
+
+
+# Écrire les tranches déjà mises en forme, dans l'ordre, jusqu'à n'en laisser que `keep` en attente
+def drain(writer, keep=0):
+    while len(writer['pending']) > keep:
+        writer['stream'].write(writer['pending'].popleft().result())
+
+
+def write_frame(writer, df):
+    if not len(df) and writer['header']:
+        writer['stream'].write(format_rows(df, True, writer['to_csv_kwargs']))
+        writer['header'] = False
+    for start in range(0, len(df), FORMAT_ROWS):
+        rows = df.iloc[start:start + FORMAT_ROWS]
+        if writer['pool'] is None:
+            writer['stream'].write(format_rows(rows, writer['header'], writer['to_csv_kwargs']))
+        else:
+            writer['pending'].append(writer['pool'].submit(format_rows, rows, writer['header'],
+                                                           writer['to_csv_kwargs']))
+            drain(writer, writer['max_pending'])
+        writer['header'] = False
+
+
+# Terminer l'écriture et remplacer le fichier de sortie par le fichier temporaire
+def close_writer(writer):
+    try:
+        drain(writer)
+        if writer['stream'] is not writer['raw']:
+            writer['stream'].close()
+        writer['raw'].flush()
+        os.fsync(writer['raw'].fileno())
+    finally:
+        writer['raw'].close()
+        if writer['pool'] is not None:
+            writer['pool'].shutdown()
+    if not writer['append']:
+        os.replace(writer['target'], writer['path'])
+
+
+# Abandonner l'écriture : le fichier temporaire est supprimé, le fichier de sortie existant reste intact
+def abort_writer(writer):
+    if writer['pool'] is not None:
+        writer['pool'].shutdown(cancel_futures=True)
+    writer['raw'].close()
+    if not writer['append'] and os.path.exists(writer['target']):
+        os.remove(writer['target'])
+
+
+@contextmanager
+def csv_writer(path, compression='infer', workers=None, append=False, **to_csv_kwargs):
+    writer = open_writer(path, compression, workers, append, **to_csv_kwargs)
+    try:
+        yield writer
+        close_writer(writer)
+    except BaseException:
+        abort_writer(writer)
+        raise
+
+
+# Écrire un DataFrame entier (fichier moyenné par exemple)
+def write_csv(df, path, compression='infer', workers=None, **to_csv_kwargs):
+    with csv_writer(path, compression, workers, **to_csv_kwargs) as writer:
+        write_frame(writer, df)
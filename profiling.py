@@ -0,0 +1,123 @@
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Pour savoir où passe le temps d'une exécution :
+# python justplot.py --file data.txt --plot --profile [--profile-memory] [--cprofile lecture]
+# Chaque étape instrumentée (with stage('nom')) ajoute sa durée, son nombre de lignes et ses pics de mémoire
+# au rapport profil.json, écrit à côté de resultats.txt. Les étapes imbriquées sont nommées 'parent/enfant' ;
+# une étape exécutée plusieurs fois (un paquet de l'ingestion par exemple) est cumulée.
+# Sans --profile, stage() ne fait rien. En mode batch, seul le processus principal est mesuré.
+
+PROFILE_FILE = 'profil.json'
+
+STATE = {
+    'enabled': False,
+    'memory': False,
+    'cprofile_stage': None,
+    'started': None,
+    'stack': [],
+    'stages': {},
+    'profilers': {},
+}
+
+
+# Activer l'instrumentation ; memory : pics de mémoire allouée par étape (tracemalloc, ralentit l'exécution)
+# cprofile_stage : nom (ou chemin 'parent/enfant') d'une étape dont le profil cProfile est enregistré
+def enable(memory=False, cprofile_stage=None):
+    STATE.update(enabled=True, memory=memory, cprofile_stage=cprofile_stage, started=time.perf_counter(),
+                 stack=[], stages={}, profilers={})
+    if memory:
+        tracemalloc.start()
+
+
+# Pic de mémoire résidente du processus depuis son démarrage, en Ko (Linux), ou None
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+
+# Mesurer une étape ; le dictionnaire produit permet d'indiquer le nombre de lignes traitées :
+# with stage('lecture') as info:
+#     ...
+#     info['rows'] = len(df)
+@contextmanager
+def stage(name, rows=None):
+    if not STATE['enabled']:
+        yield {}
+        return
+
+    stack = STATE['stack']
+    path = '/'.join([entry['path'] for entry in stack[-1:]] + [name])
+    entry = {'path': path, 'rows': rows, 'peak': 0}
+    if STATE['memory']:
+        # Le pic atteint jusqu'ici revient à l'étape parente
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    # Un seul profil par étape, cumulé sur tous ses appels
+    profiler = None
+    if STATE['cprofile_stage'] in (name, path):
+        profiler = STATE['profilers'].setdefault(path, cProfile.Profile())
+        profiler.enable()
+
+    stack.append(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        if profiler is not None:
+            profiler.disable()
+
+        peak = None
+        if STATE['memory']:
+            peak = max(entry['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        record_stage(path, seconds, entry['rows'], peak)
+
+
+def record_stage(path, seconds, rows, peak):
+    totals = STATE['stages'].setdefault(path, {'calls': 0, 'seconds': 0.0, 'rows': None, 'peak_bytes': None,
+                                               'max_rss_kb': None})
+    totals['calls'] += 1
+    totals['seconds'] += seconds
+    if rows is not None:
+        totals['rows'] = (totals['rows'] or 0) + rows
+    if peak is not None:
+        totals['peak_bytes'] = max(totals['peak_bytes'] or 0, peak)
+    totals['max_rss_kb'] = max_rss_kb()
+
+
+# Écrire le rapport JSON (dans le répertoire de resultats.txt) ; ne fait rien si l'instrumentation est désactivée
+def save_profile(path=PROFILE_FILE):
+    if not STATE['enabled']:
+        return
+    report = {
+        'argv': sys.argv,
+        'cwd': os.getcwd(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_seconds': time.perf_counter() - STATE['started'],
+        'max_rss_kb': max_rss_kb(),
+        'stages': STATE['stages'],
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Rapport de profilage enregistré dans {path}")
+
+    for stage_path, profiler in STATE['profilers'].items():
+        profile_path = os.path.join(os.path.dirname(path), f"profil_{stage_path.replace('/', '_')}.prof")
+        profiler.dump_stats(profile_path)
+        print(f"Profil cProfile de l'étape {stage_path} enregistré dans {profile_path}")
@@ -0,0 +1,182 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_VERSION, cache_available, feather
+from gaps import in_gaps
+
+# Niveaux de la pyramide d'agrégats, en secondes ; chaque niveau est calculé à partir du précédent
+LEVELS = (1, 10, 60, 600, 3600)
+
+# Statistiques conservées pour chaque paquet (la moyenne se déduit de sum / count)
+STATS = ('sum', 'count', 'min', 'max')
+
+
+# Fusionner les lignes consécutives ayant le même numéro de paquet (keys croissant)
+# sums, counts, mins, maxs : tableaux 2D (lignes x colonnes)
+def reduce_buckets(keys, sums, counts, mins, maxs):
+    if not len(keys):
+        return keys, sums, counts, mins, maxs
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return (keys[starts],
+            np.add.reduceat(sums, starts, axis=0),
+            np.add.reduceat(counts, starts, axis=0),
+            np.fmin.reduceat(mins, starts, axis=0),
+            np.fmax.reduceat(maxs, starts, axis=0))
+
+
+# DataFrame d'un niveau : colonnes à deux niveaux (statistique, colonne), indexé par le début de chaque paquet
+def level_frame(start_seconds, columns, sums, counts, mins, maxs):
+    index = pd.DatetimeIndex(pd.to_datetime(start_seconds, unit='s'), name='horodatage')
+    arrays = dict(zip(STATS, (sums, counts, mins, maxs)))
+    return pd.concat({stat: pd.DataFrame(values, index=index, columns=columns) for stat, values in arrays.items()},
+                     axis=1)
+
+
+# Construire la pyramide {niveau: DataFrame} à partir des données brutes indexées par 'horodatage'
+# Chaque DataFrame a des colonnes à deux niveaux (statistique, colonne) et ne contient que les paquets non vides
+def build_pyramid(df, levels=LEVELS):
+    df = df.select_dtypes(include=['number']).sort_index()
+    columns = list(df.columns)
+    values = df.to_numpy(dtype='float64')
+    valid = ~np.isnan(values)
+
+    seconds = df.index.values.astype('datetime64[s]').astype(np.int64)
+    current = (seconds, np.where(valid, values, 0.0), valid.astype(np.int64), values, values)
+    previous_step = 1
+
+    pyramid = {}
+    for step in levels:
+        keys = current[0] * previous_step // step
+        current = reduce_buckets(keys, *current[1:])
+        previous_step = step
+        pyramid[step] = level_frame(current[0] * step, columns, *current[1:])
+    return pyramid
+
+
+# Ajouter des lignes postérieures aux données déjà agrégées, sans recalculer la pyramide (mode suivi)
+# Seul le dernier paquet de chaque niveau peut recevoir de nouvelles lignes ; ValueError si df_new
+# commence avant ce paquet (il faut alors reconstruire la pyramide avec build_pyramid)
+def extend_pyramid(pyramid, df_new):
+    if not len(df_new):
+        return pyramid
+    added = build_pyramid(df_new, tuple(pyramid))
+
+    extended = {}
+    for level, agg in pyramid.items():
+        new = added[level].reindex(columns=agg.columns) if len(agg) else added[level]
+        if not len(agg) or not len(new) or new.index[0] > agg.index[-1]:
+            extended[level] = pd.concat([agg, new]) if len(agg) else new
+            continue
+        if new.index[0] < agg.index[-1]:
+            raise ValueError("Les nouvelles lignes sont antérieures aux données déjà agrégées")
+
+        # Fusionner le dernier paquet existant avec le premier paquet des nouvelles lignes
+        merged = agg.iloc[-1:].copy()
+        for stat, combine in zip(STATS, (np.add, np.add, np.fmin, np.fmax)):
+            merged[stat] = combine(agg[stat].iloc[-1:].to_numpy(), new[stat].iloc[:1].to_numpy())
+        extended[level] = pd.concat([agg.iloc[:-1], merged, new.iloc[1:]])
+    return extended
+
+
+# Choisir le niveau le plus grossier dont la taille divise la fenêtre demandée
+def select_level(pyramid, window):
+    compatible = [level for level in pyramid if window % level == 0]
+    return max(compatible) if compatible else None
+
+
+# Moyennes (et min/max si demandé) par fenêtre de `window` secondes, calculées depuis la pyramide
+# Même résultat que df.resample(f'{window}s').mean() : fenêtres alignées sur minuit, fenêtres vides à NaN
+# origin : début (en secondes depuis 1970) de la grille des fenêtres, par défaut le minuit du premier paquet
+# gaps : table des écarts (gaps.find_gaps) ; les fenêtres vides qui commencent dans un écart sont omises
+# au lieu d'être remplies de NaN (un an de données avec de longues interruptions reste compact)
+def aggregate(pyramid, window, minmax=False, origin=None, gaps=None):
+    level = select_level(pyramid, window)
+    agg = pyramid[level]
+    columns = agg['sum'].columns
+    arrays = [agg[stat].to_numpy(dtype='float64') for stat in STATS]
+    if not len(agg):
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='horodatage'))
+
+    seconds = agg.index.values.astype('datetime64[s]').astype(np.int64)
+    if origin is None:
+        origin = seconds[0] - seconds[0] % 86400
+    keys = (seconds - origin) // window
+    if window != level:
+        keys, *arrays = reduce_buckets(keys, *arrays)
+    sums, counts, mins, maxs = arrays
+
+    # Remettre les fenêtres vides (NaN) entre la première et la dernière fenêtre
+    positions = keys - keys[0]
+    index = pd.date_range(pd.to_datetime(origin + keys[0] * window, unit='s'), periods=positions[-1] + 1,
+                          freq=f'{window}s', name='horodatage')
+    if gaps is not None and len(gaps):
+        keep = in_gaps(index, gaps)
+        keep[positions] = False
+        keep = ~keep
+        positions = np.cumsum(keep)[positions] - 1
+        index = index[keep]
+
+    def dense(values):
+        out = np.full((len(index), len(columns)), np.nan)
+        out[positions] = values
+        return pd.DataFrame(out, index=index, columns=columns)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = dense(np.where(counts > 0, sums / counts, np.nan))
+    if minmax:
+        result = result.join(dense(mins).add_suffix('_min')).join(dense(maxs).add_suffix('_max'))
+    return result
+
+
+def pyramid_dir(data_path):
+    return f"{os.path.splitext(data_path)[0]}_pyramid"
+
+
+def source_signature(data_path):
+    st = os.stat(data_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+# Enregistrer la pyramide à côté du fichier de données (un fichier Feather par niveau)
+def save_pyramid(pyramid, data_path):
+    if not cache_available():
+        return
+    directory = pyramid_dir(data_path)
+    os.makedirs(directory, exist_ok=True)
+    for level, agg in pyramid.items():
+        flat = agg.copy()
+        flat.columns = [f"{stat}|{col}" for stat, col in agg.columns]
+        feather.write_feather(flat.reset_index(), os.path.join(directory, f"level_{level}s.feather"),
+                              compression='uncompressed')
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'source': source_signature(data_path), 'version': CACHE_VERSION, 'levels': list(pyramid)}, f)
+
+
+# Charger la pyramide enregistrée si elle correspond toujours au fichier de données, sinon None
+def load_pyramid(data_path):
+    meta_file = os.path.join(pyramid_dir(data_path), 'meta.json')
+    if not cache_available() or not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta['source'] != source_signature(data_path) or meta.get('version') != CACHE_VERSION:
+        return None
+
+    pyramid = {}
+    for level in meta['levels']:
+        flat = feather.read_feather(os.path.join(pyramid_dir(data_path), f"level_{level}s.feather"),
+                                    memory_map=True).set_index('horodatage')
+        flat.columns = pd.MultiIndex.from_tuples([tuple(col.split('|', 1)) for col in flat.columns])
+        pyramid[level] = flat
+    return pyramid
+
+
+def load_or_build_pyramid(data_path, df):
+    pyramid = load_pyramid(data_path)
+    if pyramid is None:
+        pyramid = build_pyramid(df)
+        save_pyramid(pyramid, data_path)
+    return pyramid
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from output import write_csv
+
+# Contrôle qualité des mesures, calculé pendant l'ingestion sur chaque paquet (tableaux numpy de chaque colonne,
+# sans boucle sur les lignes) et cumulé dans stats['qa'] : il est donc enregistré avec le cache et complété
+# par le mode suivi. Pour chaque colonne numérique :
+# - missing      : valeurs absentes (champ vide ou non numérique), comptées avant le typage : les colonnes
+#                  entières les remplacent ensuite par 0 (voir schema.convert_column)
+# - zeros        : valeurs exactement nulles (souvent une absence de mesure ou de position GPS)
+# - out_of_range : valeurs hors des limites du capteur (LIMITS)
+# - stuck        : lignes d'une suite d'au moins STUCK_SAMPLES valeurs identiques (capteur figé),
+#                  colonnes DYNAMIC_COLUMNS
+# - spikes       : valeurs à plus de SPIKE_SIGMAS écarts-types de la moyenne des SPIKE_WINDOW valeurs qui
+#                  l'entourent (elle-même exclue), colonnes DYNAMIC_COLUMNS
+# Les suites figées et les fenêtres des pics ne débordent pas d'un paquet à l'autre (100 000 lignes par défaut).
+# Le résumé est écrit dans <fichier>_qualite.csv, une ligne par colonne, et totalisé dans resultats.txt.
+
+CHECKS = ('rows', 'missing', 'zeros', 'out_of_range', 'stuck', 'spikes')
+
+# Limites des capteurs (min, max) ; une colonne absente n'a pas de limite
+LIMITS = {
+    'PM1.0(ug/m3)': (0, 1000),
+    'PM2.5(ug/m3)': (0, 1000),
+    'PM10(ug/m3)': (0, 1000),
+    'N0.3(#/cm3)': (0, 100_000),
+    'N0.5(#/cm3)': (0, 100_000),
+    'N1(#/cm3)': (0, 100_000),
+    'N2.5(#/cm3)': (0, 100_000),
+    'N5(#/cm3)': (0, 100_000),
+    'N10(#/cm3)': (0, 100_000),
+    'T_DPS310(C)': (-40, 85),
+    'P_DPS310(Pa)': (30_000, 120_000),
+    'H_HDC1080(%)': (0, 100),
+    'battery level': (0, 100),
+    'T_AM2320_EXT(C)': (-40, 80),
+    'H_AM2320_EXT(%)': (0, 100),
+    'T_AM2320(C)': (-40, 80),
+    'H_AM2320(%)': (0, 100),
+    'Latitude': (-90, 90),
+    'Longitude': (-180, 180),
+    'Altitude': (-500, 9000),
+    'vitesse(km/h)': (0, 400),
+    'nb de satellites': (0, 50),
+}
+
+# Mesures qui varient normalement d'une ligne à l'autre (les coordonnées GPS, la batterie ou les satellites
+# restent légitimement constants à l'arrêt)
+DYNAMIC_COLUMNS = [
+    'PM1.0(ug/m3)', 'PM2.5(ug/m3)', 'PM10(ug/m3)',
+    'N0.3(#/cm3)', 'N0.5(#/cm3)', 'N1(#/cm3)', 'N2.5(#/cm3)', 'N5(#/cm3)', 'N10(#/cm3)',
+    'T_DPS310(C)', 'P_DPS310(Pa)', 'H_HDC1080(%)', 'T_AM2320_EXT(C)', 'H_AM2320_EXT(%)', 'T_AM2320(C)', 'H_AM2320(%)',
+]
+
+# Nombre de valeurs identiques consécutives à partir duquel un capteur est considéré figé
+STUCK_SAMPLES = 120
+
+# Fenêtre centrée (en lignes) et seuil (en écarts-types) de la détection des pics
+SPIKE_WINDOW = 31
+SPIKE_SIGMAS = 5.0
+
+
+# Nombre de lignes appartenant à une suite d'au moins min_length valeurs identiques (NaN interrompt une suite)
+def stuck_count(values, min_length=STUCK_SAMPLES):
+    if len(values) < min_length:
+        return 0
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)])
+    return int(lengths[lengths >= min_length].sum())
+
+
+# Sommes glissantes centrées sur window lignes (tronquées aux bords), par différence de sommes cumulées
+def window_sums(values, window):
+    cumulative = np.r_[0.0, np.cumsum(values)]
+    positions = np.arange(len(values))
+    half = window // 2
+    return cumulative[np.minimum(positions + half + 1, len(values))] - cumulative[np.maximum(positions - half, 0)]
+
+
+# Nombre de pics : écart à la moyenne des voisins supérieur à sigmas fois leur écart-type
+# Chaque valeur est retirée de sa propre fenêtre, pour qu'un pic isolé n'augmente pas l'écart-type qui le juge
+def spike_count(values, window=SPIKE_WINDOW, sigmas=SPIKE_SIGMAS):
+    valid = np.isfinite(values)
+    if valid.sum() < window:
+        return 0
+    # Centrer les valeurs limite les erreurs d'arrondi des sommes de carrés (pression en Pa par exemple)
+    centered = np.where(valid, values - values[valid].mean(), 0.0)
+
+    counts = window_sums(valid.astype('float64'), window) - valid
+    sums = window_sums(centered, window) - centered
+    squares = window_sums(centered ** 2, window) - centered ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        std = np.sqrt(np.maximum(squares / counts - mean ** 2, 0.0))
+        spikes = valid & (counts > window // 2) & (std > 0) & (np.abs(centered - mean) > sigmas * std)
+    return int(spikes.sum())
+
+
+# Compteurs de qualité d'un DataFrame : {colonne: {vérification: nombre}}
+def qa_counts(df):
+    counts = {}
+    for col in df.select_dtypes(include=['number']).columns:
+        values = df[col].to_numpy(dtype='float64')
+        low, high = LIMITS.get(col, (-np.inf, np.inf))
+        dynamic = col in DYNAMIC_COLUMNS
+        counts[col] = {
+            'rows': len(values),
+            'missing': int(np.isnan(values).sum()),
+            'zeros': int((values == 0).sum()),
+            'out_of_range': int(((values < low) | (values > high)).sum()),
+            'stuck': stuck_count(values) if dynamic else 0,
+            'spikes': spike_count(values) if dynamic else 0,
+        }
+    return counts
+
+
+# Ajouter les compteurs d'un paquet aux compteurs cumulés (modifiés sur place)
+def add_counts(total, counts):
+    for col, checks in counts.items():
+        column_total = total.setdefault(col, dict.fromkeys(CHECKS, 0))
+        for check, value in checks.items():
+            column_total[check] += value
+    return total
+
+
+def qa_table(counts):
+    table = pd.DataFrame.from_dict(counts, orient='index', columns=list(CHECKS))
+    table.index.name = 'column'
+    return table
+
+
+# Afficher les colonnes ayant au moins un défaut
+def print_qa(counts):
+    labels = {'missing': 'manquantes', 'zeros': 'nulles', 'out_of_range': 'hors limites', 'stuck': 'figées',
+              'spikes': 'pics'}
+    for col, checks in counts.items():
+        problems = [f"{checks[check]} {label}" for check, label in labels.items() if checks[check]]
+        if problems:
+            print(f"Qualité {col} : {', '.join(problems)} (sur {checks['rows']} lignes)")
+
+
+# Ligne de resultats.txt : total de chaque défaut sur toutes les colonnes, vide sans compteurs
+def qa_summary(counts):
+    if not counts:
+        return ''
+    totals = {check: sum(checks[check] for checks in counts.values()) for check in CHECKS[1:]}
+    return (f"Qualité : {totals['missing']} valeurs manquantes, {totals['zeros']} nulles, "
+            f"{totals['out_of_range']} hors limites, {totals['stuck']} figées, {totals['spikes']} pics\n")
+
+
+def qa_path(file_path):
+    return f"{os.path.splitext(file_path)[0]}_qualite.csv"
+
+
+# Écrire le résumé qualité d'un fichier (<fichier>_qualite.csv) ; ne fait rien sans compteurs
+def save_qa(file_path, counts):
+    if not counts:
+        return
+    write_csv(qa_table(counts), qa_path(file_path), workers=1, sep=',')
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_DIR, cache_available, feather, meta_path, pa, read_meta, segment_paths
+from cleaning import TIMESTAMP_FORMAT
+
+# Lecture d'une plage de temps et de quelques colonnes seulement, par exemple une matinée de campagne :
+# python justplot.py --file data.txt --from 2024-03-07T06:00 --to 2024-03-07T12:00 --columns PM2.5(ug/m3)
+# La plage se lit directement dans le cache (fichiers Feather en mémoire partagée, voir cache.py) :
+# - chaque segment du cache a son horodatage minimal et maximal dans le fichier .json de l'entrée,
+#   les segments hors de la plage ne sont pas ouverts ;
+# - dans un segment trié (cas habituel), les lignes de la plage sont trouvées par recherche dichotomique
+#   sur la colonne 'horodatage' et seules les colonnes demandées sont converties en DataFrame.
+# La fin de la plage est exclue. Sans cache valide, le fichier est chargé entièrement (et mis en cache)
+# avant d'être découpé.
+
+
+# Lire une date des options --from/--to : format du logger (2024_03_07_06_00_00) ou ISO (2024-03-07T06:00)
+def parse_time(text):
+    if text is None:
+        return None
+    try:
+        return pd.to_datetime(text, format=TIMESTAMP_FORMAT)
+    except ValueError:
+        return pd.Timestamp(text)
+
+
+# Liste de colonnes de l'option --columns (séparées par des virgules), ou None pour toutes
+def parse_columns(text):
+    if not text:
+        return None
+    return [col.strip() for col in text.split(',') if col.strip()]
+
+
+def is_query(start=None, end=None, columns=None):
+    return start is not None or end is not None or bool(columns)
+
+
+# Suffixe des fichiers produits à partir d'une plage (ex. _20240307T060000-20240307T120000), vide sans plage
+def range_suffix(start=None, end=None):
+    if start is None and end is None:
+        return ''
+    return '_' + '-'.join('' if ts is None else ts.strftime('%Y%m%dT%H%M%S') for ts in (start, end))
+
+
+def check_columns(columns, available):
+    unknown = [col for col in columns if col not in available]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {', '.join(unknown)} (colonnes : {', '.join(available)})")
+
+
+# Bornes (positions de début et de fin) des horodatages de [start, end) ; ns : horodatages en nanosecondes
+def row_bounds(ns, start=None, end=None, is_sorted=True):
+    if not is_sorted:
+        mask = np.ones(len(ns), dtype=bool)
+        if start is not None:
+            mask &= ns >= start.value
+        if end is not None:
+            mask &= ns < end.value
+        return mask
+    lo = np.searchsorted(ns, start.value) if start is not None else 0
+    hi = np.searchsorted(ns, end.value) if end is not None else len(ns)
+    return slice(lo, max(lo, hi))
+
+
+# Découper un DataFrame déjà chargé (indexé par 'horodatage') comme le ferait query_cached
+def select_range(df, start=None, end=None, columns=None):
+    if columns:
+        check_columns(columns, list(df.columns))
+        df = df[columns]
+    if start is None and end is None:
+        return df
+    rows = row_bounds(df.index.asi8, start, end, df.index.is_monotonic_increasing)
+    return df.iloc[rows] if isinstance(rows, slice) else df[rows]
+
+
+# Lire la plage [start, end) et les colonnes demandées depuis le cache, sans lire le fichier source
+# L'entrée doit correspondre exactement au fichier (même taille et même date) ; sinon (None, None) et
+# le fichier doit être chargé normalement. Retourne (df, stats de l'ingestion)
+def query_cached(file_path, dtype_dict, start=None, end=None, columns=None, cache_dir=CACHE_DIR):
+    if not cache_available():
+        return None, None
+    meta = read_meta(meta_path(file_path, cache_dir), dtype_dict)
+    if meta is None:
+        return None, None
+
+    st = os.stat(file_path)
+    data_files = segment_paths(meta, dtype_dict, cache_dir)
+    if ((st.st_size, st.st_mtime_ns) != (meta['size'], meta['mtime_ns'])
+            or not all(os.path.exists(data_file) for data_file in data_files)):
+        return None, None
+    if columns:
+        check_columns(columns, [col for col in dtype_dict if col != 'horodatage'])
+
+    # Segment sans bornes (vide) : lu et filtré
+    ranges = meta.get('ranges') or [None] * len(data_files)
+    tables = []
+    for data_file, bounds in zip(data_files, ranges):
+        if bounds is not None and ((start is not None and bounds['max'] < start.value)
+                                   or (end is not None and bounds['min'] >= end.value)):
+            continue
+        table = feather.read_table(data_file, columns=['horodatage', *columns] if columns else None,
+                                   memory_map=True)
+        ns = table.column('horodatage').to_numpy().astype('datetime64[ns]').view(np.int64)
+        rows = row_bounds(ns, start, end, bounds is not None and bounds['sorted'])
+        tables.append(table.slice(rows.start, rows.stop - rows.start) if isinstance(rows, slice)
+                      else table.filter(pa.array(rows)))
+
+    if not tables:
+        # Aucun segment dans la plage : DataFrame vide avec les colonnes demandées
+        table = feather.read_table(data_files[0], columns=['horodatage', *columns] if columns else None,
+                                   memory_map=True)
+        tables = [table.slice(0, 0)]
+    df = pa.concat_tables(tables).to_pandas(split_blocks=True).set_index('horodatage')
+    return df, meta['stats']
@@ -0,0 +1,190 @@
+import base64
+import gzip
+import hashlib
+import html
+import json
+
+import numpy as np
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+# Pour exporter un rapport au lieu d'ouvrir un onglet par graphique :
+# python justplot.py --plot --report
+# python main.py --mode D --report rapport.html
+# Le rapport est un seul fichier HTML : plotly.js n'y est inclus qu'une fois, les tableaux de chaque
+# section sont stockés en binaire compressé (gzip + base64) et chaque section n'est décompressée
+# et tracée que lorsqu'elle devient visible à l'écran.
+
+# Clés pour lesquelles la précision float64 est conservée (timestamps, coordonnées GPS) ;
+# les autres tableaux numériques (mesures) sont stockés en float32
+PRECISE_KEYS = ('x', 'lat', 'lon')
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script>{plotly_js}</script>
+<style>
+body {{ font-family: sans-serif; margin: 0 2em; }}
+nav a {{ margin-right: 1em; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<nav>{nav}</nav>
+{sections}
+<script>
+const TYPES = {{f4: Float32Array, f8: Float64Array}};
+const TEMPLATE = {template};
+
+async function inflate(b64) {{
+    const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    return new Response(stream).arrayBuffer();
+}}
+
+// Remplacer les références {{"__array__": k}} par les tableaux typés décodés
+function resolve(value, arrays) {{
+    if (Array.isArray(value)) return value.map(v => resolve(v, arrays));
+    if (value && typeof value === 'object') {{
+        if ('__array__' in value) return arrays[value.__array__];
+        return Object.fromEntries(Object.entries(value).map(([k, v]) => [k, resolve(v, arrays)]));
+    }}
+    return value;
+}}
+
+async function render(section) {{
+    const payload = JSON.parse(document.getElementById(`data-${{section.dataset.index}}`).textContent);
+    const buffer = await inflate(payload.blob);
+    const arrays = payload.arrays.map(a => new TYPES[a.dtype](buffer, a.offset, a.length));
+    for (const fig of payload.figures) {{
+        const div = document.createElement('div');
+        section.appendChild(div);
+        fig.layout.template = fig.layout.template || TEMPLATE;
+        await Plotly.newPlot(div, resolve(fig.data, arrays), fig.layout, {{responsive: true}});
+    }}
+    section.style.minHeight = '';
+}}
+
+const observer = new IntersectionObserver(entries => {{
+    for (const entry of entries) {{
+        if (entry.isIntersecting) {{
+            observer.unobserve(entry.target);
+            render(entry.target);
+        }}
+    }}
+}}, {{rootMargin: '200px'}});
+document.querySelectorAll('section').forEach(section => observer.observe(section));
+</script>
+</body>
+</html>
+"""
+
+SECTION_TEMPLATE = """<section id="section-{index}" data-index="{index}" style="min-height: {height}px">
+<h2>{title}</h2>
+</section>
+<script type="application/json" id="data-{index}">{payload}</script>"""
+
+FIGURE_HEIGHT = 450
+
+
+# Tableaux binaires d'une section : chaque tableau distinct n'est stocké qu'une fois
+# (les traces d'un même graphique partagent le même tableau de timestamps)
+def new_pool():
+    return {'chunks': [], 'arrays': [], 'keys': {}, 'size': 0}
+
+
+def add_array(pool, values):
+    data = values.tobytes()
+    key = (values.dtype.str, hashlib.blake2b(data, digest_size=16).hexdigest())
+    if key not in pool['keys']:
+        pool['keys'][key] = len(pool['arrays'])
+        pool['arrays'].append({'dtype': 'f4' if values.dtype == np.float32 else 'f8',
+                               'offset': pool['size'], 'length': len(values)})
+        # Aligner chaque tableau sur 8 octets pour pouvoir créer la vue typée côté navigateur
+        padding = -len(data) % 8
+        pool['chunks'].append(data + b'\0' * padding)
+        pool['size'] += len(data) + padding
+    return {'__array__': pool['keys'][key]}
+
+
+# Remplacer les tableaux numériques d'une trace (y compris marker.color, marker.size...) par des références
+# Retourne True si la trace contient des dates (converties en millisecondes depuis 1970)
+def encode_arrays(obj, pool):
+    has_dates = False
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            has_dates |= encode_arrays(value, pool)
+        elif isinstance(value, np.ndarray) and value.ndim == 1 and value.dtype.kind in 'fiubM':
+            if value.dtype.kind == 'M':
+                ms = value.astype('datetime64[ms]')
+                value = np.where(np.isnat(ms), np.nan, ms.astype(np.int64)).astype(np.float64)
+                has_dates = True
+            else:
+                value = value.astype(np.float64 if key in PRECISE_KEYS else np.float32)
+            obj[key] = add_array(pool, value)
+    return has_dates
+
+
+# Thème par défaut de plotly, inclus une seule fois dans la page plutôt que dans chaque figure
+def default_template():
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def encode_figure(fig, pool, template=None):
+    spec = fig.to_plotly_json()
+    if template is not None and spec['layout'].get('template') == template:
+        del spec['layout']['template']
+    has_dates = False
+    for trace in spec['data']:
+        has_dates |= encode_arrays(trace, pool)
+
+    # Les dates sont envoyées en millisecondes : forcer les axes x en type 'date'
+    if has_dates:
+        layout = spec['layout']
+        for key in [key for key in layout if key.startswith('xaxis')] or ['xaxis']:
+            layout.setdefault(key, {}).setdefault('type', 'date')
+    return spec
+
+
+def section_payload(figures, template=None):
+    pool = new_pool()
+    specs = [encode_figure(fig, pool, template) for fig in figures]
+    blob = gzip.compress(b''.join(pool['chunks']), mtime=0)
+    payload = json.dumps({'figures': specs, 'arrays': pool['arrays'], 'blob': base64.b64encode(blob).decode()},
+                         cls=PlotlyJSONEncoder)
+    # Ne pas fermer la balise <script> par erreur si un titre contient '</'
+    return payload.replace('</', '<\\/')
+
+
+# Écrire le rapport : sections = liste de (titre, liste de figures)
+# La hauteur réservée pour chaque section évite que toutes les sections soient visibles (et tracées) dès l'ouverture
+def write_report(path, sections, title):
+    sections = [(section_title, figures) for section_title, figures in sections if figures]
+    template = default_template()
+    page = PAGE_TEMPLATE.format(
+        title=html.escape(title),
+        plotly_js=get_plotlyjs(),
+        template=json.dumps(template, cls=PlotlyJSONEncoder),
+        nav=' '.join(f'<a href="#section-{i}">{html.escape(str(section_title))}</a>'
+                     for i, (section_title, _) in enumerate(sections)),
+        sections='\n'.join(SECTION_TEMPLATE.format(index=i, title=html.escape(str(section_title)),
+                                                   height=sum(fig.layout.height or FIGURE_HEIGHT for fig in figures),
+                                                   payload=section_payload(figures, template))
+                           for i, (section_title, figures) in enumerate(sections)),
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    print(f"Rapport enregistré dans {path}")
+
+
+# Afficher les figures dans le navigateur, ou les regrouper dans un seul rapport HTML si report_path est donné
+def output_sections(sections, title, report_path=None):
+    if report_path:
+        write_report(report_path, sections, title)
+        return
+    for _, figures in sections:
+        for fig in figures:
+            fig.show()
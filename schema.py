@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# Types de colonnes et dtype utilisé en mémoire (et dans le cache) pour chacun :
+# 'timestamp' : champ texte converti en datetime64[ns] (entier int64 : nanosecondes depuis 1970) par clean_timestamps
+# 'sensor'    : mesure, float32 (précision largement suffisante pour les capteurs)
+# 'count'     : petit entier positif (satellites, batterie), uint8
+# 'coordinate': latitude/longitude, float64 pour garder une précision de l'ordre du centimètre
+KIND_DTYPES = {
+    'timestamp': 'str',
+    'sensor': 'float32',
+    'count': 'uint8',
+    'coordinate': 'float64',
+}
+
+# Formats de fichiers connus, versionnés : ajouter une nouvelle version plutôt que modifier une version existante
+# header : True si la première ligne contient les noms des colonnes
+# delimiter : séparateur des champs (les fichiers TXT du logger peuvent aussi utiliser ';', remplacé à la lecture)
+SCHEMAS = {
+    'logger-v1': {
+        'description': "Fichier TXT du logger : PM, N, T/P/H, batterie, capteur AM2320 externe, GPS",
+        'header': False,
+        'delimiter': ',',
+        'columns': [
+            ('horodatage', 'timestamp'),
+            ('PM1.0(ug/m3)', 'sensor'),
+            ('PM2.5(ug/m3)', 'sensor'),
+            ('PM10(ug/m3)', 'sensor'),
+            ('N0.3(#/cm3)', 'sensor'),
+            ('N0.5(#/cm3)', 'sensor'),
+            ('N1(#/cm3)', 'sensor'),
+            ('N2.5(#/cm3)', 'sensor'),
+            ('N5(#/cm3)', 'sensor'),
+            ('N10(#/cm3)', 'sensor'),
+            ('T_DPS310(C)', 'sensor'),
+            ('P_DPS310(Pa)', 'sensor'),
+            ('H_HDC1080(%)', 'sensor'),
+            ('battery level', 'count'),
+            ('T_AM2320_EXT(C)', 'sensor'),
+            ('H_AM2320_EXT(%)', 'sensor'),
+            ('Latitude', 'coordinate'),
+            ('Longitude', 'coordinate'),
+            ('Altitude', 'sensor'),
+            ('vitesse(km/h)', 'sensor'),
+            ('nb de satellites', 'count'),
+        ],
+    },
+    'csv-v1': {
+        'description': "Fichier CSV avec en-tête lu par main.py : PM, T/H avec capteur AM2320 interne",
+        'header': True,
+        'delimiter': ';',
+        'columns': [
+            ('horodatage', 'timestamp'),
+            ('PM1.0(ug/m3)', 'sensor'),
+            ('PM2.5(ug/m3)', 'sensor'),
+            ('PM10(ug/m3)', 'sensor'),
+            ('T_DPS310(C)', 'sensor'),
+            ('T_AM2320(C)', 'sensor'),
+            ('H_HDC1080(%)', 'sensor'),
+            ('H_AM2320(%)', 'sensor'),
+        ],
+    },
+}
+
+
+def schema_columns(schema):
+    return [name for name, _ in schema['columns']]
+
+
+# dtype_dict du schéma : {colonne: dtype}, utilisé par l'ingestion et comme clé du cache
+def schema_dtypes(schema):
+    return {name: KIND_DTYPES[kind] for name, kind in schema['columns']}
+
+
+# Colonnes de mesures (capteurs et compteurs), sans l'horodatage ni les coordonnées GPS
+def numeric_columns(schema):
+    return [name for name, kind in schema['columns'] if kind in ('sensor', 'count')]
+
+
+# Reconnaître le format à partir des champs de la première ligne valide du fichier
+# Un en-tête doit correspondre exactement ; sinon, le plus petit format sans en-tête ayant assez de colonnes est retenu
+def match_schema(fields):
+    if fields[0] == 'horodatage':
+        for name, schema in SCHEMAS.items():
+            if schema['header'] and fields == schema_columns(schema):
+                return name
+        raise ValueError(f"En-tête inconnu : {','.join(fields)}")
+
+    candidates = [name for name, schema in SCHEMAS.items()
+                  if not schema['header'] and len(fields) <= len(schema['columns'])]
+    if not candidates:
+        raise ValueError(f"Aucun format connu n'a {len(fields)} champs (formats : {', '.join(SCHEMAS)})")
+    return min(candidates, key=lambda name: len(SCHEMAS[name]['columns']))
+
+
+# Convertir une colonne texte au dtype du schéma
+# Les valeurs non numériques deviennent NaN, ou 0 pour les colonnes entières (comme les champs vides)
+def convert_column(values, dtype):
+    numeric = pd.to_numeric(values, errors='coerce')
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        info = np.iinfo(dtype)
+        numeric = numeric.fillna(0).clip(info.min, info.max)
+    return numeric.astype(dtype)
@@ -0,0 +1,222 @@
+import json
+import threading
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from downsample import MAX_POINTS, downsample_indices
+
+# Pour lancer le serveur local :
+# python justplot.py --plot --serve
+# Chaque graphique affiche d'abord une vue d'ensemble réduite ; à chaque zoom (rangeselector,
+# rangeslider ou sélection), la page redemande au serveur les points de la plage visible.
+# En mode suivi (python justplot.py --follow), le serveur relit régulièrement le fichier ; la page
+# interroge /version et redemande la plage affichée dès que de nouvelles lignes sont arrivées.
+
+DEFAULT_PORT = 8050
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="/plotly.js"></script>
+</head>
+<body>
+{divs}
+<script>
+const groups = {groups};
+const POLL_MS = {poll_ms};
+
+function toTraces(data, group) {{
+    return data.traces.map((trace, i) => ({{
+        x: trace.x, y: trace.y, type: 'scatter', mode: 'lines', name: group.columns[i], connectgaps: false
+    }}));
+}}
+
+async function fetchData(index, start, end) {{
+    let url = `/data?group=${{index}}`;
+    if (start !== undefined) url += `&start=${{encodeURIComponent(start)}}&end=${{encodeURIComponent(end)}}`;
+    const response = await fetch(url);
+    return response.json();
+}}
+
+groups.forEach(async (group, index) => {{
+    const div = document.getElementById(`fig-${{index}}`);
+    const layout = {{
+        title: group.title,
+        xaxis: {{
+            title: 'Temps', type: 'date', rangeslider: {{visible: true}},
+            rangeselector: {{buttons: [
+                {{count: 1, label: '1h', step: 'hour', stepmode: 'backward'}},
+                {{count: 6, label: '6h', step: 'hour', stepmode: 'backward'}},
+                {{count: 1, label: '1j', step: 'day', stepmode: 'backward'}},
+                {{step: 'all'}}
+            ]}}
+        }},
+        yaxis: {{title: group.yaxis_title}},
+        hovermode: 'x unified'
+    }};
+    await Plotly.newPlot(div, toTraces(await fetchData(index), group), layout);
+    div.dataset.ready = '1';
+
+    div.on('plotly_relayout', async (event) => {{
+        let start, end;
+        if (event['xaxis.range[0]'] !== undefined) {{
+            start = event['xaxis.range[0]'];
+            end = event['xaxis.range[1]'];
+        }} else if (event['xaxis.range'] !== undefined) {{
+            [start, end] = event['xaxis.range'];
+        }} else if (!event['xaxis.autorange']) {{
+            return;
+        }}
+        const data = await fetchData(index, start, end);
+        Plotly.restyle(div, {{x: data.traces.map(t => t.x), y: data.traces.map(t => t.y)}});
+    }});
+}});
+
+// Mode suivi : recharger la plage affichée (ou tout, sans zoom) de chaque graphique quand les données changent
+let version = 0;
+async function poll() {{
+    const current = (await (await fetch('/version')).json()).version;
+    if (current === version) return;
+    version = current;
+    groups.forEach(async (group, index) => {{
+        const div = document.getElementById(`fig-${{index}}`);
+        if (!div.dataset.ready) return;
+        const xaxis = div.layout.xaxis;
+        const data = xaxis.autorange ? await fetchData(index) : await fetchData(index, xaxis.range[0], xaxis.range[1]);
+        Plotly.restyle(div, {{x: data.traces.map(t => t.x), y: data.traces.map(t => t.y)}});
+    }});
+}}
+if (POLL_MS > 0) setInterval(poll, POLL_MS);
+</script>
+</body>
+</html>
+"""
+
+
+# Extraire la plage [start, end] d'un groupe de colonnes et la réduire à max_points points par trace
+# Borne de la fenêtre demandée ; une date avec fuseau (ex. ...Z) est ramenée en UTC sans fuseau, comme l'index
+def parse_bound(text):
+    ts = pd.Timestamp(text)
+    return ts.tz_convert(None) if ts.tzinfo is not None else ts
+
+
+def window_data(df, columns, start=None, end=None, max_points=MAX_POINTS, method='m4'):
+    lo = 0 if start is None else df.index.searchsorted(parse_bound(start), side='left')
+    hi = len(df) if end is None else df.index.searchsorted(parse_bound(end), side='right')
+
+    # Garder un point de part et d'autre pour que la courbe touche les bords de la fenêtre
+    lo, hi = max(lo - 1, 0), min(hi + 1, len(df))
+    index = df.index[lo:hi]
+    x_ms = index.asi8 // 1_000_000 if len(index) else np.array([], dtype=np.int64)
+
+    traces = []
+    for col in columns:
+        y = df[col].to_numpy(dtype='float64')[lo:hi]
+        idx = downsample_indices(index, y, max_points, method)
+        y_sel = y[idx]
+        traces.append({
+            'x': x_ms[idx].tolist(),
+            'y': np.where(np.isnan(y_sel), None, y_sel).tolist(),
+        })
+    return {'traces': traces}
+
+
+# state : {'df': données, 'version': compteur incrémenté à chaque mise à jour} ; poll_ms = 0 désactive le suivi
+def make_handler(state, groups, title, max_points, method, poll_ms=0):
+    page = PAGE_TEMPLATE.format(
+        title=title,
+        poll_ms=poll_ms,
+        divs='\n'.join(f'<div id="fig-{i}" style="height:600px"></div>' for i in range(len(groups))),
+        groups=json.dumps([
+            {'title': f"{group['title']} - {title}", 'yaxis_title': group['yaxis_title'], 'columns': group['columns']}
+            for group in groups
+        ]),
+    ).encode()
+    from plotly.offline import get_plotlyjs
+    plotly_js = get_plotlyjs().encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def send(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/':
+                self.send(page, 'text/html; charset=utf-8')
+            elif url.path == '/plotly.js':
+                self.send(plotly_js, 'application/javascript')
+            elif url.path == '/version':
+                self.send(json.dumps({'version': state['version']}).encode(), 'application/json')
+            elif url.path == '/data':
+                query = parse_qs(url.query)
+                try:
+                    columns = groups[int(query['group'][0])]['columns']
+                    data = window_data(state['df'], columns, query.get('start', [None])[0],
+                                       query.get('end', [None])[0], max_points, method)
+                except (KeyError, IndexError, ValueError, TypeError):
+                    # Groupe ou bornes invalides
+                    self.send_error(400)
+                    return
+                self.send(json.dumps(data).encode(), 'application/json')
+            else:
+                self.send_error(404)
+
+        # Ne pas afficher chaque requête dans le terminal
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# Lancer le serveur local et ouvrir la page dans le navigateur ; bloque jusqu'à Ctrl+C
+# groups : groupes de capteurs au format de figures.SENSOR_GROUPS
+# update : fonction sans argument appelée toutes les `interval` secondes (mode suivi), qui retourne
+# les données complètes mises à jour, ou None si rien n'a changé
+def serve(df, groups, title, port=DEFAULT_PORT, max_points=MAX_POINTS, method='m4', open_browser=True,
+          update=None, interval=5):
+    state = {'df': df.sort_index(), 'version': 0}
+    poll_ms = int(interval * 1000) if update else 0
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state, groups, title, max_points, method, poll_ms))
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"Serveur de visualisation démarré sur {url} (Ctrl+C pour arrêter)")
+
+    stop = threading.Event()
+    follower = None
+    if update:
+        follower = threading.Thread(target=follow, args=(state, update, interval, stop), daemon=True)
+        follower.start()
+    if open_browser:
+        threading.Timer(0.5, webbrowser.open, args=(url,)).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Serveur arrêté")
+    finally:
+        # Attendre la fin de la mise à jour en cours : l'appelant peut ensuite terminer ses fichiers
+        stop.set()
+        if follower is not None:
+            follower.join()
+        server.server_close()
+
+
+# Boucle du mode suivi : les requêtes en cours gardent l'ancien DataFrame, les suivantes voient le nouveau
+def follow(state, update, interval, stop):
+    while not stop.wait(interval):
+        try:
+            df = update()
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour : {e}")
+            continue
+        if df is not None:
+            state['df'] = df if df.index.is_monotonic_increasing else df.sort_index()
+            state['version'] += 1
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from gaps import MAX_GAP, find_gaps, insert_gaps
+from pyramid import LEVELS, aggregate, build_pyramid, extend_pyramid
+from track import STATIONARY_M, simplify_track
+
+# Traitement par flux (--stream) des fichiers plus grands que la mémoire : les paquets de l'ingestion
+# (ingest.iter_chunks) passent un par un dans stream_chunk et ne sont jamais réunis en un seul DataFrame.
+# Seuls restent en mémoire :
+# - les paquets de la moyenne dont la fenêtre n'est pas terminée (reportés sur le paquet suivant) ;
+# - la pyramide d'agrégats des graphiques, dont les niveaux trop fins sont abandonnés au-delà de PLOT_ROWS paquets ;
+# - la table des écarts, le min/max de chaque colonne et la trace GPS simplifiée paquet par paquet.
+# Les lignes doivent arriver dans l'ordre chronologique (c'est le cas des fichiers du logger) : une ligne
+# antérieure à la seconde de la dernière ligne traitée est comptée dans late_rows et n'est pas agrégée
+# (elle reste dans le CSV nettoyé).
+
+# Nombre maximal de paquets gardés par niveau de la pyramide des graphiques (mémoire bornée quelle que soit
+# la durée du fichier : un an à 1 Hz est tracé depuis le niveau 600s ou 3600s)
+PLOT_ROWS = 100_000
+
+# Colonnes gardées pour la carte
+TRACK_COLUMNS = ['Latitude', 'Longitude', 'Altitude', 'vitesse(km/h)', 'nb de satellites', 'PM2.5(ug/m3)']
+
+
+# interval : fenêtre de la moyenne en secondes (None : pas de moyenne)
+# track_tolerance : écart maximal (m) de la trace GPS simplifiée, None pour ne pas garder la trace
+# plot : False pour ne pas construire la pyramide des graphiques (moyenne seule, mode suivi)
+def new_stream(interval=None, minmax=False, max_gap=MAX_GAP, track_tolerance=None, plot=True):
+    return {
+        'interval': interval,
+        'plot_levels': LEVELS if plot else (),
+        'minmax': minmax,
+        'max_gap': max_gap,
+        'track_tolerance': track_tolerance,
+        # Niveau de la pyramide lu pour la moyenne, et début de la grille des fenêtres (minuit du premier jour)
+        'average_level': max(level for level in LEVELS if interval % level == 0) if interval else None,
+        'origin': None,
+        'average': None,
+        'plot': None,
+        'last': None,
+        'gaps': [],
+        'min': None,
+        'max': None,
+        'rows': 0,
+        'late_rows': 0,
+        'track': [],
+        'track_points': 0,
+    }
+
+
+# Ajouter un paquet ; retourne les lignes moyennées des fenêtres terminées (None sans moyenne)
+def stream_chunk(state, chunk):
+    chunk = chunk.sort_index()
+    if state['last'] is not None and len(chunk):
+        late = chunk.index < state['last'].floor('s')
+        if late.any():
+            state['late_rows'] += int(late.sum())
+            chunk = chunk[~late]
+    if not len(chunk):
+        return None
+    state['rows'] += len(chunk)
+
+    # Min/max de toutes les données, pour normaliser sans relire le fichier
+    numeric = chunk.select_dtypes(include=['number'])
+    minimum, maximum = numeric.min(), numeric.max()
+    state['min'] = minimum if state['min'] is None else np.fmin(state['min'], minimum)
+    state['max'] = maximum if state['max'] is None else np.fmax(state['max'], maximum)
+
+    # Écarts, y compris entre la dernière ligne du paquet précédent et la première de celui-ci
+    index = chunk.index if state['last'] is None else chunk.index.insert(0, state['last'])
+    gaps = find_gaps(index, state['max_gap'])
+    if len(gaps):
+        state['gaps'].append(gaps)
+    state['last'] = chunk.index[-1]
+
+    if state['plot_levels']:
+        state['plot'] = extend_levels(state['plot'], chunk, state['plot_levels'])
+        while len(state['plot']) > 1 and len(state['plot'][min(state['plot'])]) > PLOT_ROWS:
+            del state['plot'][min(state['plot'])]
+
+    if state['track_tolerance'] is not None and 'Latitude' in chunk.columns:
+        track = gps_points(chunk)
+        state['track_points'] += len(track)
+        state['track'].append(simplify_track(track, state['track_tolerance'],
+                                             STATIONARY_M if state['track_tolerance'] else 0) if len(track) else track)
+
+    if not state['interval']:
+        return None
+    if state['origin'] is None:
+        first = int(chunk.index[0].timestamp())
+        state['origin'] = first - first % 86400
+    state['average'] = extend_levels(state['average'], chunk, (state['average_level'],))
+
+    # Seule la dernière fenêtre peut encore recevoir des lignes : les précédentes sont moyennées et oubliées
+    agg = state['average'][state['average_level']]
+    last = int(agg.index[-1].timestamp())
+    boundary = last - (last - state['origin']) % state['interval']
+    done = agg.index < pd.to_datetime(boundary, unit='s')
+    state['average'] = {state['average_level']: agg[~done]}
+    return average_rows(state, agg[done])
+
+
+# Lignes moyennées des fenêtres restantes, après le dernier paquet
+def finish_stream(state):
+    if not state['interval'] or state['average'] is None:
+        return None
+    return average_rows(state, state['average'][state['average_level']])
+
+
+def extend_levels(pyramid, chunk, levels):
+    return build_pyramid(chunk, levels) if pyramid is None else extend_pyramid(pyramid, chunk)
+
+
+# Même résultat que pyramid.aggregate sur toutes les données, fenêtres vides retirées comme dans average_data
+def average_rows(state, agg):
+    if not len(agg):
+        return None
+    return aggregate({state['average_level']: agg}, state['interval'], state['minmax'],
+                     state['origin']).dropna(how='all')
+
+
+# Points GPS valides du paquet (la trace est ensuite simplifiée paquet par paquet, extrémités gardées)
+def gps_points(chunk):
+    track = chunk[[col for col in TRACK_COLUMNS if col in chunk.columns]]
+    track = track.dropna(subset=['Latitude', 'Longitude'])
+    return track[(track['Latitude'] != 0) & (track['Longitude'] != 0)]
+
+
+# Table de tous les écarts détectés (voir gaps.find_gaps)
+def stream_gaps(state):
+    if not state['gaps']:
+        return find_gaps(pd.DatetimeIndex([]), state['max_gap'])
+    return pd.concat(state['gaps'], ignore_index=True)
+
+
+# Trace GPS de tout le fichier, ou None
+def stream_track(state):
+    tracks = [track for track in state['track'] if len(track)]
+    return pd.concat(tracks) if tracks else None
+
+
+# Données des graphiques : moyenne de chaque paquet du niveau le plus fin conservé, avec les coupures
+# (seuil d'au moins deux paquets, un écart plus court est normal à ce niveau) ; retourne (DataFrame, niveau)
+def stream_plot_frame(state, columns):
+    if state['plot'] is None:
+        return None, None
+    level = min(state['plot'])
+    agg = state['plot'][level]
+    columns = [col for col in columns if col in agg['sum'].columns]
+    counts = agg['count'][columns].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, agg['sum'][columns].to_numpy() / counts, np.nan)
+    df = pd.DataFrame(means, index=agg.index, columns=columns)
+    max_gap = max(pd.Timedelta(state['max_gap']), pd.Timedelta(2 * level, 's'))
+    return insert_gaps(df, max_gap), level
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Réduction des traces GPS avant l'affichage sur la carte :
+# - les points immobiles (bruit GPS à l'arrêt) sont fusionnés ;
+# - la trace est simplifiée par Douglas-Peucker : aucun point retiré n'est à plus de TOLERANCE_M mètres
+#   de la trace simplifiée ;
+# - ou bien les mesures sont agrégées par cellules hexagonales (moyenne de PM2.5 le long du trajet).
+
+# Écart maximal en mètres entre la trace simplifiée et les points retirés
+TOLERANCE_M = 5.0
+
+# Déplacement minimal en mètres pour garder un point (en dessous, le logger est considéré immobile)
+STATIONARY_M = 2.0
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+# Projection équirectangulaire locale en mètres, centrée sur la latitude moyenne (précise à l'échelle d'une ville)
+def project(lat, lon, lat0=None):
+    lat0 = np.nanmean(lat) if lat0 is None else lat0
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(lat0))
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return x, y, lat0
+
+
+def unproject(x, y, lat0):
+    return np.degrees(y / EARTH_RADIUS_M), np.degrees(x / (EARTH_RADIUS_M * np.cos(np.radians(lat0))))
+
+
+# Indices des points qui quittent la case (carré de min_distance mètres) du point précédent
+# Les points successifs dans la même case (logger immobile) sont réduits au premier
+def moving_indices(x, y, min_distance=STATIONARY_M):
+    if not min_distance or len(x) < 2:
+        return np.arange(len(x))
+    cells_x = np.floor(x / min_distance)
+    cells_y = np.floor(y / min_distance)
+    moved = np.r_[True, (cells_x[1:] != cells_x[:-1]) | (cells_y[1:] != cells_y[:-1])]
+    moved[-1] = True
+    return np.flatnonzero(moved)
+
+
+# Indices des points gardés par Douglas-Peucker, sans récursion : chaque segment est traité
+# en une opération vectorisée sur ses points intérieurs
+def douglas_peucker_indices(x, y, tolerance=TOLERANCE_M):
+    n = len(x)
+    if not tolerance or n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        # Distance au segment (ou au point de départ si le segment est de longueur nulle : boucle)
+        distances = np.abs(dx * py - dy * px) / length if length else np.hypot(px, py)
+        i = int(distances.argmax())
+        if distances[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+# Simplifier une trace (lignes dans l'ordre chronologique, colonnes 'Latitude' et 'Longitude')
+# Retourne le sous-ensemble des lignes gardées
+def simplify_track(df, tolerance=TOLERANCE_M, min_distance=STATIONARY_M):
+    x, y, _ = project(df['Latitude'].to_numpy(dtype='float64'), df['Longitude'].to_numpy(dtype='float64'))
+    moving = moving_indices(x, y, min_distance)
+    kept = moving[douglas_peucker_indices(x[moving], y[moving], tolerance)]
+    return df.iloc[kept]
+
+
+# Agréger une colonne par cellules hexagonales de size mètres (distance entre centres voisins)
+# Deux réseaux rectangulaires décalés : chaque point va au centre le plus proche (comme matplotlib.hexbin)
+# Retourne un DataFrame (Latitude, Longitude du centre, moyenne, min, max, count) par cellule non vide
+def hexbin(df, column, size):
+    values = df[column].to_numpy(dtype='float64')
+    valid = np.isfinite(values)
+    x, y, lat0 = project(df['Latitude'].to_numpy(dtype='float64')[valid],
+                         df['Longitude'].to_numpy(dtype='float64')[valid])
+    values = values[valid]
+
+    sx, sy = size, size * np.sqrt(3)
+    u, v = x / sx, y / sy
+    i1, j1 = np.round(u), np.round(v)
+    i2, j2 = np.floor(u), np.floor(v)
+    second = (u - i1) ** 2 + 3 * (v - j1) ** 2 > (u - i2 - 0.5) ** 2 + 3 * (v - j2 - 0.5) ** 2
+    centers_x = np.where(second, i2 + 0.5, i1) * sx
+    centers_y = np.where(second, j2 + 0.5, j1) * sy
+
+    cells, keys = np.unique(np.c_[centers_x, centers_y], axis=0, return_inverse=True)
+    keys = keys.ravel()
+    counts = np.bincount(keys, minlength=len(cells))
+    lat, lon = unproject(cells[:, 0], cells[:, 1], lat0)
+    grouped = pd.Series(values).groupby(keys)
+    return pd.DataFrame({
+        'Latitude': lat,
+        'Longitude': lon,
+        column: np.bincount(keys, weights=values, minlength=len(cells)) / counts,
+        'min': grouped.min().to_numpy(),
+        'max': grouped.max().to_numpy(),
+        'count': counts,
+    })